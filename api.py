@@ -1,4 +1,8 @@
+import cProfile
+import collections
 import functools
+import logging
+import os
 import simplejson as json
 import ast
 import exception_handler
@@ -6,15 +10,34 @@ import mongoengine
 import re
 import time
 
-from datetime import datetime
+import datetime
 
-from flask import Blueprint, Flask, redirect, url_for, session, jsonify, current_app, make_response, render_template, request, session, abort
+from flask import Blueprint, Flask, redirect, url_for, session, jsonify, current_app, make_response, render_template, request, session, abort, g, Response
 
 from flask_principal import Identity, AnonymousIdentity, identity_changed
 
 from models import models
-from camera_notifier.notifier import CameraNotifier
-from invoker import ActionInvoker, AlgorithmInvoker
+from camera_notifier.notifier import CameraNotifier, notify_agent_start_many, \
+    inflight_publishes
+from invoker import ActionInvoker, AlgorithmInvoker, invoke_algorithms_bulk
+from scheduler import cooldown_scheduler
+from catalog import catalog_cache
+from rules import rule_cache, option_key_is_valid
+from ingest import ResultQueue
+from debounce import result_debouncer
+from response_cache import response_cache, cached_response
+from events import event_bus, TooManySubscribers
+from ratelimit import rate_limited, rate_limiter, admission, \
+    too_many_requests
+from connection_pool import get_pools
+from placement import worker_registry
+from reaper import LeaseReaper, get_lease_expiry
+from results_store import result_store
+from profiles import profile_cache
+from trigger_scheduler import TriggerScheduler, first_trigger_at, \
+    reschedule_profile
+import serializer
+import metrics
 import utils
 # import exception_handler
 import random
@@ -22,20 +45,80 @@ import werkzeug
 from werkzeug.exceptions import BadRequest, NotFound, Conflict
 from config import *
 import requests
+import bson
 from bson import ObjectId
+from mongoengine.queryset.visitor import Q
 import urllib, hashlib
 
 api = Blueprint('api', __name__, template_folder='templates')
 CREATE_CAMERA_FIELDS = ['actions', 'name']
-UPDATE_CAMERA_FIELDS = ['actions', 'name', 'description']
+OPTIONAL_CAMERA_FIELDS = ['profile', 'trigger_interval']
+UPDATE_CAMERA_FIELDS = [
+    'actions', 'name', 'description', 'profile', 'trigger_interval'
+]
 CREATE_ALGORITHM_FIELDS = ['name', 'options', 'description']
 UPDATE_ALGORITHM_FIELDS = ['name', 'options', 'description']
 CREATE_ACTION_FIELDS = ['name', 'params', 'description']
 UPDATE_ACTION_FIELDS = ['name', 'params', 'description']
+CREATE_PROFILE_FIELDS = ['name', 'actions', 'description', 'trigger_interval']
+UPDATE_PROFILE_FIELDS = ['name', 'actions', 'description', 'trigger_interval']
+CAMERA_LIST_FIELDS = [
+    'id', 'name', 'streaming_url', 'action_dict', 'algorithm_status',
+    'profile', 'trigger_interval'
+]
+ALGORITHM_LIST_FIELDS = ['id', 'name', 'description', 'options']
+ACTION_LIST_FIELDS = ['id', 'name', 'description', 'params']
+PROFILE_LIST_FIELDS = [
+    'id', 'name', 'description', 'action_dict', 'trigger_interval'
+]
+CAMERA_LIST_ORDER = ('-last_updated', '-id')
+CATALOG_LIST_ORDER = ('id',)
+CURSOR_KEY_CONVERTERS = {
+    'last_updated': lambda v: datetime.datetime.fromisoformat(v),
+    'id': ObjectId,
+}
 
 def _build_error(error_code, message):
     return {"status_code": error_code, "data": message}
 
+@api.before_request
+def _start_request_timer():
+    g.request_started = time.time()
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@api.after_request
+def _record_request_metrics(response):
+    endpoint = request.endpoint or 'unknown'
+    metrics.http_request_duration.observe(
+        time.time() - g.request_started,
+        endpoint=endpoint,
+        method=request.method
+    )
+    metrics.http_requests.inc(
+        endpoint=endpoint,
+        method=request.method,
+        status=response.status_code
+    )
+    return response
+
+@api.teardown_request
+def _stop_request_profiler(exc):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return
+    profiler.disable()
+    if time.time() - g.request_started > PROFILE_THRESHOLD:
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(
+                PROFILE_DIR,
+                '%s-%d.prof' % (request.endpoint, time.time() * 1000)
+            ))
+        except OSError:
+            logging.exception('Cannot write request profile')
+
 def _get_request_args(**kwargs):
     args = dict(request.args)
     for key, value in args.items():
@@ -47,26 +130,158 @@ def _get_request_args(**kwargs):
                 args[key] = converter(value)
     return args
 
-def _validate_camera_actions(actions):
+def _get_list_params(allowed_fields):
+    limit = request.args.get('limit')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            return None, _build_error(400, "limit must be an integer")
+        if not 0 < limit <= LIST_PAGE_MAX:
+            return None, _build_error(
+                400, "limit must be between 1 and %d" % LIST_PAGE_MAX
+            )
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        try:
+            cursor = utils.decode_cursor(cursor)
+        except ValueError as e:
+            return None, _build_error(400, e.__str__())
+    fields = request.args.get('fields')
+    if fields is not None:
+        fields = [f for f in fields.split(',') if f]
+        invalid_fields = set(fields) - set(allowed_fields)
+        if invalid_fields:
+            return None, _build_error(
+                400, "Invalid fields: %s" % ", ".join(sorted(invalid_fields))
+            )
+    return {'limit': limit, 'cursor': cursor, 'fields': fields}, None
+
+def _cursor_values(document, order):
+    values = []
+    for key in order:
+        value = getattr(document, key.lstrip('-'))
+        if isinstance(value, datetime.datetime):
+            value = value.isoformat()
+        values.append(str(value) if isinstance(value, ObjectId) else value)
+    return values
+
+def _apply_cursor(queryset, cursor, order):
+    """Restrict a queryset ordered by `order` to documents after `cursor`."""
+    if len(cursor) != len(order):
+        raise ValueError('cursor does not match the list ordering')
+    keys = [key.lstrip('-') for key in order]
+    values = [
+        CURSOR_KEY_CONVERTERS[key](value) for key, value in zip(keys, cursor)
+    ]
+    query = None
+    for i, key in enumerate(keys):
+        op = 'lt' if order[i].startswith('-') else 'gt'
+        clause = Q(**{'%s__%s' % (key, op): values[i]})
+        for prev_key, prev_value in zip(keys[:i], values[:i]):
+            clause &= Q(**{prev_key: prev_value})
+        query = clause if query is None else query | clause
+    return queryset.filter(query)
+
+def _list_documents(queryset, order, params):
+    """Return (items, next_cursor, error) for a keyset-paginated listing.
+
+    Without a limit, items is a lazy iterator over the whole queryset when
+    STREAM_LIST_RESPONSES is enabled.
+    """
+    queryset = queryset.order_by(*order)
+    fields = params['fields']
+    if fields:
+        queryset = queryset.only(
+            *set(fields) | set(key.lstrip('-') for key in order)
+        )
+    if params['cursor'] is not None:
+        try:
+            queryset = _apply_cursor(queryset, params['cursor'], order)
+        except (ValueError, TypeError, bson.errors.InvalidId) as e:
+            return None, None, _build_error(400, "Invalid cursor: %s" % e)
+    limit = params['limit']
+    next_cursor = None
+    if limit is not None:
+        documents = list(queryset.limit(limit + 1))
+        if len(documents) > limit:
+            documents = documents[:limit]
+            next_cursor = utils.encode_cursor(
+                _cursor_values(documents[-1], order)
+            )
+    else:
+        documents = queryset.batch_size(STREAM_BATCH_SIZE)
+    items = (d.to_dict() for d in documents)
+    if fields:
+        items = ({k: item[k] for k in fields} for item in items)
+    if limit is not None or not STREAM_LIST_RESPONSES:
+        items = list(items)
+    return items, next_cursor, None
+
+def _make_list_response(items, next_cursor):
+    if not isinstance(items, list):
+        return utils.make_json_stream_response(200, items)
+    resp = utils.make_json_response(200, items)
+    if next_cursor:
+        resp.headers['X-Next-Cursor'] = next_cursor
+    return resp
+
+def _list_validator(document, fields=('last_updated',)):
+    """Validator for cached_response derived from a collection's version.
+
+    Any write to a listed document moves one of its `fields`, and deletes
+    change the count, so the ETag changes whenever any listing could.
+    """
+    def validator():
+        count, latest = models.get_collection_version(document, fields)
+        version = '%s:%d:%s' % (
+            document.__name__, count, latest.isoformat() if latest else ''
+        )
+        return hashlib.sha1(version.encode()).hexdigest(), latest
+    return validator
+
+def _get_camera_filters():
+    """Parse `algorithm_status=<algorithm>:<status>` query arguments.
+
+    The filter is built as a raw query, so an algorithm name can never be
+    read as a mongoengine operator such as `a1__ne`.
+    """
+    query = {}
+    for value in request.args.getlist('algorithm_status'):
+        algorithm, _, status = value.partition(':')
+        if not algorithm or not status:
+            return None, _build_error(
+                400,
+                "algorithm_status filter must look like <algorithm>:<status>"
+            )
+        if '.' in algorithm or algorithm.startswith('$'):
+            return None, _build_error(
+                400,
+                "Invalid algorithm name: %s" % algorithm
+            )
+        query['algorithm_status.%s' % algorithm] = status
+    return ({'__raw__': query} if query else {}), None
+
+def _validate_camera_actions(actions, catalog=None):
     if actions == {}:
         return {}, None
 
-    all_algorithm_objs = models.Algorithm.objects.all()
-    all_action_objs = models.Action.objects.all()
-    all_algorithms = [a.name for a in all_algorithm_objs]
-    all_actions = [a.name for a in all_action_objs]
-    all_options = ['else']
-    for algo_obj in all_algorithm_objs:
-        all_options.extend(algo_obj.options)
+    if catalog is None:
+        catalog = catalog_cache.get()
 
     invalid_algos = list(
-        filter(lambda x: not(x in all_algorithms), actions.keys())
+        filter(lambda x: x not in catalog.algorithms, actions.keys())
     )
     if invalid_algos:
         return None, "Algorithms not found: " + ", ".join(invalid_algos)
 
     invalid_options = list(
-        filter(lambda x: not(set(x.keys())<=set(all_options)), actions.values())
+        filter(
+            lambda x: not all(
+                option_key_is_valid(k, catalog.options) for k in x.keys()
+            ),
+            actions.values()
+        )
     )
     if invalid_options:
         return None, "These options are invalid: " + str(invalid_options)
@@ -81,28 +296,22 @@ def _validate_camera_actions(actions):
                 invalid_keys.extend(
                     list(set(f.keys()) - set(['action', 'params']))
                 )
-                if f['action'] not in all_actions:
+                this_action_params = catalog.actions.get(f['action'])
+                if this_action_params is None:
                     invalid_actions.append(f['action'])
                     continue
-                else:
-                    this_action_params = list(
-                        filter(
-                            lambda x: x.name==f['action'], all_action_objs
+                try:
+                    invalid_params.extend(
+                        list(set(f['params']) - set(this_action_params))
+                    )
+                    missing_params.extend(
+                        list(
+                            catalog.required_params[f['action']]
+                            - set(f['params'])
                         )
-                    )[0].params
-                    required_action_params = {
-                        k:v for k, v in this_action_params.items() if
-                            v['required']=='true'
-                    }
-                    try:
-                        invalid_params.extend(
-                            list(set(f['params']) - set(this_action_params))
-                        )
-                        missing_params.extend(
-                            list(set(required_action_params) - set(f['params']))
-                        )
-                    except:
-                        pass
+                    )
+                except:
+                    pass
 
     action_error_message = ""
     if invalid_actions:
@@ -134,9 +343,158 @@ def _validate_action_params(params):
         return "Invalid parameters: " + str(invalid_params)
     return
 
-def _get_camera_by_id(camera_id):
+def _reactivate_algorithm(camera_id, algorithm):
+    """Stop the instance of an algorithm in cooldown, then make it idle.
+
+    The algorithm stays in 'cooldown' until its instance is stopped, so a
+    trigger cannot start a new instance that this stop would then kill.
+    """
     try:
-        camera = models.Camera.objects.get(id=camera_id)
+        camera = models.Camera.objects.only(
+            'algorithm_status', 'algorithm_hosts'
+        ).get(id=camera_id)
+    except models.Camera.DoesNotExist:
+        return
+    if camera.algorithm_status.get(algorithm) != 'cooldown':
+        return
+    host = camera.algorithm_hosts.get(algorithm)
+    algorithm_invoker = AlgorithmInvoker(camera_id, worker_registry.get(host))
+    algorithm_invoker.reactivate_algorithms([algorithm])
+    if camera.set_algorithm_status(algorithm, 'idle', expected=['cooldown']):
+        response_cache.invalidate('cameras')
+        event_bus.publish(
+            'status', camera.id, algorithm=algorithm, status='idle'
+        )
+    if host and camera.clear_algorithm_host(algorithm, host):
+        worker_registry.release(host)
+
+def _claim_algorithms(camera, action_dict):
+    """Mark every idle algorithm of a camera running on an algorithm host.
+
+    Each algorithm is claimed with a conditional idle -> running update, so
+    concurrent triggers never start the same algorithm twice. An algorithm
+    keeps the host it was placed on while that host is registered.
+    Returns an ordered {algorithm: host key} of the claimed algorithms.
+    """
+    claimed = collections.OrderedDict()
+    for algorithm in action_dict.keys():
+        host, placed = worker_registry.place(
+            camera.id, algorithm, (camera.algorithm_hosts or {}).get(algorithm)
+        )
+        if camera.set_algorithm_status(
+            algorithm, 'running', expected=['idle', None], host=host,
+            lease=get_lease_expiry(algorithm)
+        ):
+            claimed[algorithm] = host
+        elif placed:
+            worker_registry.release(host)
+    if claimed:
+        response_cache.invalidate('cameras')
+    for algorithm in claimed:
+        event_bus.publish(
+            'status', camera.id, algorithm=algorithm, status='running'
+        )
+    return claimed
+
+def _release_algorithms(camera, claimed):
+    for algorithm, host in claimed.items():
+        camera.set_algorithm_status(algorithm, 'idle')
+        if host and camera.clear_algorithm_host(algorithm, host):
+            worker_registry.release(host)
+        event_bus.publish(
+            'status', camera.id, algorithm=algorithm, status='idle'
+        )
+    response_cache.invalidate('cameras')
+
+def _group_by_host(claimed):
+    groups = collections.OrderedDict()
+    for algorithm, host in claimed.items():
+        groups.setdefault(host, []).append(algorithm)
+    return groups
+
+def _start_claimed(claims):
+    """Start claimed algorithms, sharing one RPyC connection per host.
+
+    `claims` lists (camera, action_dict, {algorithm: host}). When a host
+    fails, only the algorithms that were not sent are released; instances
+    started on it before the failure, or on other hosts, keep their status
+    and host so they are not started twice.
+    Returns ({camera id: started algorithms}, {camera id: error}).
+    """
+    targets = collections.OrderedDict()
+    for camera, action_dict, claimed in claims:
+        for host, algorithms in _group_by_host(claimed).items():
+            targets.setdefault(host, []).append(
+                (camera.id,
+                 {k: action_dict[k] for k in algorithms},
+                 camera.streaming_url)
+            )
+    sent = collections.defaultdict(set)
+    errors = {}
+    for host, host_targets in targets.items():
+        results, error = invoke_algorithms_bulk(
+            host_targets, worker_registry.get(host)
+        )
+        for camera_id, started in results.items():
+            sent[camera_id].update(started)
+        if error is None:
+            continue
+        logging.error('Cannot start algorithms on %s: %s', host, error)
+        for camera_id, action_dict, _ in host_targets:
+            if not set(action_dict) <= sent[camera_id]:
+                errors[str(camera_id)] = '%s: %s' % (host, error)
+    triggered = {}
+    for camera, action_dict, claimed in claims:
+        failed = collections.OrderedDict(
+            (k, v) for k, v in claimed.items() if k not in sent[camera.id]
+        )
+        if failed:
+            _release_algorithms(camera, failed)
+        triggered[str(camera.id)] = [k for k in claimed if k not in failed]
+    return triggered, errors
+
+def _trigger_camera(camera, action_dict):
+    """Start every idle algorithm of a camera.
+
+    `action_dict` is the camera's action_dict resolved against its profile.
+    Returns the names of the started algorithms and the error of the host
+    that failed to start the others, if any.
+    """
+    claimed = _claim_algorithms(camera, action_dict)
+    if not claimed:
+        return [], None
+    triggered, errors = _start_claimed([(camera, action_dict, claimed)])
+    return triggered[str(camera.id)], errors.get(str(camera.id))
+
+def _trigger_cameras(cameras):
+    """Trigger many cameras, sharing one RPyC connection per host and batch.
+
+    Returns ({camera id: started algorithms}, {camera id: error}) where
+    errors name the host that failed to start some of the algorithms.
+    """
+    triggered = {}
+    errors = {}
+    for start in range(0, len(cameras), BULK_BATCH_SIZE):
+        claims = []
+        for camera in cameras[start:start + BULK_BATCH_SIZE]:
+            action_dict = profile_cache.resolve(camera)
+            claimed = _claim_algorithms(camera, action_dict)
+            triggered[str(camera.id)] = []
+            if claimed:
+                claims.append((camera, action_dict, claimed))
+        if not claims:
+            continue
+        batch_triggered, batch_errors = _start_claimed(claims)
+        triggered.update(batch_triggered)
+        errors.update(batch_errors)
+    return triggered, errors
+
+def _get_camera_by_id(camera_id, fields=None):
+    try:
+        cameras = models.Camera.objects
+        if fields:
+            cameras = cameras.only(*fields)
+        camera = cameras.get(id=camera_id)
     except mongoengine.errors.ValidationError as e:
         return None, _build_error(400, e.__str__())
     except models.Camera.DoesNotExist as e:
@@ -152,6 +510,42 @@ def _get_algorithm_by_id(algorithm_id):
         return None, _build_error(400, e.__str__())
     return algorithm, None
 
+def _get_profile_by_id(profile_id):
+    try:
+        profile = models.RuleProfile.objects.get(id=profile_id)
+    except mongoengine.errors.ValidationError as e:
+        return None, _build_error(400, e.__str__())
+    except models.RuleProfile.DoesNotExist as e:
+        return None, _build_error(404, e.__str__())
+    return profile, None
+
+def _get_profile_ref(profile_id):
+    """Return (ObjectId, error) for a camera's profile; None detaches."""
+    if profile_id is None:
+        return None, None
+    if not ObjectId.is_valid(profile_id) or \
+            profile_cache.get(profile_id) is None:
+        return None, _build_error(400, "Profile not found: %s" % profile_id)
+    return ObjectId(profile_id), None
+
+def _get_trigger_interval(value):
+    """Return (seconds, error) for a trigger interval; None unschedules."""
+    if value is None:
+        return None, None
+    if not isinstance(value, int) or isinstance(value, bool) or \
+            value < TRIGGER_MIN_INTERVAL:
+        return None, _build_error(
+            400,
+            "trigger_interval must be an integer of at least %d seconds"
+                % TRIGGER_MIN_INTERVAL
+        )
+    return value, None
+
+def _schedule_camera(camera):
+    """Set the first scheduled trigger of a camera from its interval."""
+    interval = profile_cache.trigger_interval(camera)
+    camera.next_trigger_at = first_trigger_at(interval) if interval else None
+
 def _get_action_by_id(action_id):
     try:
         action = models.Action.objects.get(id=action_id)
@@ -162,21 +556,55 @@ def _get_action_by_id(action_id):
     return action, None
 
 @api.route('/api/cameras', methods=['GET'])
+@cached_response('cameras', _list_validator(
+    models.Camera, ('last_updated', 'status_updated')
+))
 def list_cameras():
-    cameras = models.Camera.objects.order_by('-last_updated')
-    cameras = [c.to_dict() for c in cameras]
-    return utils.make_json_response(
-        200,
-        cameras
-        )
+    params, error = _get_list_params(CAMERA_LIST_FIELDS)
+    if error:
+        return utils.make_json_response(**error)
+    filters, error = _get_camera_filters()
+    if error:
+        return utils.make_json_response(**error)
+    cameras, next_cursor, error = _list_documents(
+        models.Camera.objects(**filters), CAMERA_LIST_ORDER, params
+    )
+    if error:
+        return utils.make_json_response(**error)
+    return _make_list_response(cameras, next_cursor)
+
+def _missing_camera_fields(data):
+    """Required keys missing from a new camera; actions may come from its
+    profile instead."""
+    required = ['name']
+    if data.get('profile') is None:
+        required.append('actions')
+    return [k for k in required if k not in data]
 
 @api.route('/api/cameras', methods=['POST'])
 def register_camera():
     data = utils.get_request_data()
+    missing = _missing_camera_fields(data)
+    if missing:
+        return utils.make_json_response(
+            400,
+            "Missing keys: " + ", ".join(missing)
+        )
 
     camera = models.Camera()
     camera.name = data['name']
-    actions, errors = _validate_camera_actions(data['actions'])
+    if 'profile' in data:
+        camera.profile, error = _get_profile_ref(data['profile'])
+        if error:
+            return utils.make_json_response(**error)
+    camera.trigger_interval, error = _get_trigger_interval(
+        data.get('trigger_interval')
+    )
+    if error:
+        return utils.make_json_response(**error)
+    actions, errors = _validate_camera_actions(
+        data['actions'] if 'actions' in data or not camera.profile else {}
+    )
     if not errors:
         camera.action_dict = actions
     else:
@@ -184,9 +612,11 @@ def register_camera():
             400,
             errors
         )
+    _schedule_camera(camera)
     camera.streaming_url = RTMP_SERVER + '/' + data['name']
     camera.last_updated = datetime.datetime.now()
     camera.save()
+    response_cache.invalidate('cameras')
     notifier = CameraNotifier(camera.id, camera.streaming_url)
     notifier.notify_agent_start()
     return utils.make_json_response(
@@ -194,15 +624,194 @@ def register_camera():
         camera.to_dict()
     )
 
+@api.route('/api/cameras/bulk', methods=['POST'])
+def register_cameras():
+    data = utils.get_request_data()
+    items = data.get('cameras')
+    if not isinstance(items, list) or not items:
+        return utils.make_json_response(
+            400,
+            "cameras must be a non-empty list"
+        )
+    if len(items) > BULK_MAX_CAMERAS:
+        return utils.make_json_response(
+            400,
+            "At most %d cameras can be registered at once" % BULK_MAX_CAMERAS
+        )
+    catalog = catalog_cache.get()
+    now = datetime.datetime.now()
+    cameras = []
+    errors = {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or _missing_camera_fields(item) or \
+                not set(item.keys()) <= \
+                set(CREATE_CAMERA_FIELDS + OPTIONAL_CAMERA_FIELDS):
+            errors[index] = "Each camera needs these keys: " \
+                + ", ".join(CREATE_CAMERA_FIELDS) + " and may have: " \
+                + ", ".join(OPTIONAL_CAMERA_FIELDS) \
+                + "; actions may be left out when a profile is given"
+            continue
+        profile = None
+        if item.get('profile') is not None:
+            profile, error = _get_profile_ref(item['profile'])
+            if error:
+                errors[index] = error['data']
+                continue
+        trigger_interval, error = _get_trigger_interval(
+            item.get('trigger_interval')
+        )
+        if error:
+            errors[index] = error['data']
+            continue
+        actions, error = _validate_camera_actions(
+            item.get('actions', {}), catalog
+        )
+        if error:
+            errors[index] = error
+            continue
+        camera = models.Camera(
+            id=ObjectId(),
+            name=item['name'],
+            action_dict=actions,
+            profile=profile,
+            trigger_interval=trigger_interval,
+            algorithm_status={k: 'idle' for k in actions.keys()},
+            streaming_url=RTMP_SERVER + '/' + item['name'],
+            last_updated=now
+        )
+        _schedule_camera(camera)
+        try:
+            camera.validate()
+        except mongoengine.errors.ValidationError as e:
+            errors[index] = e.__str__()
+            continue
+        cameras.append(camera)
+    if errors:
+        return utils.make_json_response(400, errors)
+
+    names = [c.name for c in cameras]
+    duplicates = set(
+        name for name, count in collections.Counter(names).items() if count > 1
+    )
+    duplicates |= set(models.Camera.objects(name__in=names).scalar('name'))
+    if duplicates:
+        return utils.make_json_response(
+            409,
+            "Cameras already exist: " + ", ".join(sorted(duplicates))
+        )
+    try:
+        models.Camera.objects.insert(cameras, load_bulk=False)
+    except mongoengine.errors.NotUniqueError as e:
+        return utils.make_json_response(
+            409,
+            e.__str__()
+        )
+    response_cache.invalidate('cameras')
+    for start in range(0, len(cameras), BULK_BATCH_SIZE):
+        notify_agent_start_many(
+            (c.id, c.streaming_url)
+            for c in cameras[start:start + BULK_BATCH_SIZE]
+        )
+    return utils.make_json_response(
+        200,
+        [c.to_dict() for c in cameras]
+    )
+
+@api.route('/api/cameras/trigger', methods=['POST'])
+@rate_limited('trigger', per_request=False)
+def trigger_cameras():
+    data = utils.get_request_data()
+    camera_ids = data.get('cameras')
+    if not isinstance(camera_ids, list) or not camera_ids:
+        return utils.make_json_response(
+            400,
+            "cameras must be a non-empty list of camera ids"
+        )
+    if len(camera_ids) > BULK_MAX_CAMERAS:
+        return utils.make_json_response(
+            400,
+            "At most %d cameras can be triggered at once" % BULK_MAX_CAMERAS
+        )
+    invalid_ids = [i for i in camera_ids if not ObjectId.is_valid(i)]
+    if invalid_ids:
+        return utils.make_json_response(
+            400,
+            "Invalid camera ids: " + ", ".join(map(str, invalid_ids))
+        )
+    found = list(
+        models.Camera.objects(id__in=camera_ids).only(
+            'action_dict', 'streaming_url', 'algorithm_hosts', 'profile'
+        )
+    )
+    # Each camera costs a token of its own bucket and of the global one,
+    # as if it had been triggered on its own.
+    cameras = []
+    limited = {}
+    for camera in found:
+        retry_after = rate_limiter.check('trigger', camera.id)
+        if retry_after is None:
+            cameras.append(camera)
+        else:
+            limited[str(camera.id)] = retry_after
+    if limited and not cameras:
+        return too_many_requests(
+            'trigger', 'rate_limit', min(limited.values()),
+            'Rate limit exceeded'
+        )
+    triggered, errors = _trigger_cameras(cameras)
+    return utils.make_json_response(
+        200,
+        {
+            'status': 'triggered',
+            'cameras': triggered,
+            'errors': errors,
+            'rate_limited': sorted(limited),
+            'not_found': sorted(
+                set(map(str, camera_ids)) - set(triggered) - set(limited)
+            )
+        }
+    )
+
+@api.route('/api/cameras/stream', methods=['GET'])
+def stream_camera_events():
+    try:
+        subscription = event_bus.subscribe(
+            request.args.getlist('camera_id') or None
+        )
+    except TooManySubscribers as e:
+        return utils.make_json_response(503, e.__str__())
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                event = subscription.get(EVENT_HEARTBEAT_INTERVAL)
+                if event is None:
+                    yield ': keepalive\n\n'
+                    continue
+                yield 'event: %s\ndata: %s\n\n' % (
+                    event['type'], serializer.dumps(event).decode('utf-8')
+                )
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    resp = Response(generate(), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
+
 @api.route('/api/cameras/<string:camera_id>', methods=['GET'])
+@cached_response('cameras')
 def get_camera(camera_id):
     camera, error = _get_camera_by_id(camera_id)
     if error:
         return utils.make_json_response(**error)
-    return utils.make_json_response(
+    resp = utils.make_json_response(
         200,
         camera.to_dict()
     )
+    resp.last_modified = camera.get_last_modified()
+    return resp
 
 @api.route('/api/cameras/<string:camera_id>', methods=['PUT'])
 def update_camera(camera_id):
@@ -228,9 +837,22 @@ def update_camera(camera_id):
             )
         data['action_dict'] = actions
         data.pop('actions', None)
+    if 'profile' in data.keys():
+        data['profile'], error = _get_profile_ref(data['profile'])
+        if error:
+            return utils.make_json_response(**error)
+    if 'trigger_interval' in data.keys():
+        data['trigger_interval'], error = _get_trigger_interval(
+            data['trigger_interval']
+        )
+        if error:
+            return utils.make_json_response(**error)
     for k, v in data.items():
         setattr(camera, k, v)
+    if 'profile' in data.keys() or 'trigger_interval' in data.keys():
+        _schedule_camera(camera)
     camera.save()
+    response_cache.invalidate('cameras')
     camera.last_updated = datetime.datetime.now()
     return utils.make_json_response(
         200,
@@ -244,6 +866,10 @@ def unregister_camera(camera_id):
         return utils.make_json_response(**error)
     camera_name = camera.name
     camera.delete()
+    rule_cache.invalidate(camera.id)
+    response_cache.invalidate('cameras')
+    result_store.delete(camera.id)
+    result_debouncer.forget(camera.id)
     return utils.make_json_response(
         200,
         {
@@ -253,12 +879,12 @@ def unregister_camera(camera_id):
     )
 
 @api.route('/api/cameras/<string:camera_id>/trigger', methods=['POST'])
+@rate_limited('trigger')
 def trigger_camera_algorithm(camera_id):
     camera, error = _get_camera_by_id(camera_id)
     if error:
         return utils.make_json_response(**error)
-    algorithm_status = camera.algorithm_status
-    action_dict = camera.action_dict
+    action_dict = profile_cache.resolve(camera)
     if action_dict == {}:
         return utils.make_json_response(
             200,
@@ -266,28 +892,18 @@ def trigger_camera_algorithm(camera_id):
                 'status': 'No algorithm specified.'
             }
         )
-    available_action_dict = {
-        k:v for k, v in action_dict.items() if algorithm_status[k] == 'idle'
-    }
-    algorithm_invoker = AlgorithmInvoker(
-        camera_id
-    )
-    algorithm_invoker.invoke_current_algorithms(
-            available_action_dict,
-            camera.streaming_url
-    )
-    for algorithm_name in available_action_dict.keys():
-        algorithm_status[algorithm_name] = 'running'
-    camera.algorithm_status = algorithm_status
-    camera.save()
+    triggered, error = _trigger_camera(camera, action_dict)
     return utils.make_json_response(
         200,
         {
-            'status': 'triggered'
+            'status': 'triggered',
+            'algorithms': triggered,
+            'error': error
         }
     )
 
 @api.route('/api/cameras/<string:camera_id>/agent_start', methods=['POST'])
+@rate_limited('agent_start')
 def trigger_agent_start(camera_id):
     camera, error = _get_camera_by_id(camera_id)
     if error:
@@ -300,50 +916,345 @@ def trigger_agent_start(camera_id):
     )
 
 @api.route('/api/cameras/<string:camera_id>/result', methods=['POST'])
+@rate_limited('result')
 def update_algorithm_result(camera_id):
-    camera, error = _get_camera_by_id(camera_id)
+    camera, error = _get_camera_by_id(
+        camera_id, fields=['last_updated', 'profile']
+    )
     if error:
         return utils.make_json_response(**error)
     data = utils.get_request_data()
-    for algorithm, result in data.items():
-        camera.algorithm_status[algorithm] = 'idle'
-        try:
-            action_list = camera.action_dict[algorithm][result]
-        except KeyError:
-            action_list = camera.action_dict[algorithm]['else']
-        for action in action_list:
-            if not action:
-                pass
-            action_invoker = ActionInvoker(
-                camera_id
-            )
-            action_invoker.invoke_action(
-                action['params'],
-                action['action']
-            )
+    if not data or not all(isinstance(k, str) for k in data.keys()):
+        return utils.make_json_response(
+            400,
+            "Result must map algorithm names to results"
+        )
+    if RESULT_INGESTION_MODE == 'queue':
+        result_queue.put(camera.id, data)
+        return utils.make_json_response(
+            202,
+            {
+                "status": "queued"
+            }
+        )
+    outcomes, suppressed, unknown = _apply_algorithm_results(camera, data)
+    return utils.make_json_response(
+        200,
+        {
+            "status": "complete",
+            "actions": outcomes,
+            "suppressed": suppressed,
+            "unknown": unknown
+        }
+    )
 
-        # Algorithms cooldown time: 15 seconds.
-        time.sleep(15)
-        algorithm_invoker = AlgorithmInvoker(camera_id)
-        algorithm_invoker.reactivate_algorithms([algorithm])
-    camera.save()
+@api.route('/api/cameras/<string:camera_id>/heartbeat', methods=['POST'])
+def renew_algorithm_leases(camera_id):
+    """Renew the leases of running algorithms of a camera.
+
+    Algorithm hosts call this while an instance is alive; `algorithms`
+    defaults to every algorithm of the camera. Algorithms reported as lost
+    are no longer running here and their instance should stop.
+    """
+    camera, error = _get_camera_by_id(
+        camera_id, fields=['action_dict', 'profile']
+    )
+    if error:
+        return utils.make_json_response(**error)
+    data = utils.get_request_data()
+    algorithms = data.get(
+        'algorithms', list(profile_cache.resolve(camera).keys())
+    )
+    if not isinstance(algorithms, list):
+        return utils.make_json_response(400, 'algorithms must be a list')
+    renewed = []
+    lost = []
+    for algorithm in algorithms:
+        if camera.renew_algorithm_lease(
+            algorithm, get_lease_expiry(algorithm)
+        ):
+            renewed.append(algorithm)
+        else:
+            lost.append(algorithm)
     return utils.make_json_response(
         200,
         {
-            "status": "complete"
+            "renewed": renewed,
+            "lost": lost
         }
     )
 
+def _parse_time(value):
+    """Parse epoch seconds or ISO 8601 into naive local time.
 
-@api.route('/api/algorithms', methods=['GET'])
-def list_algorithms():
-    algorithms = models.Algorithm.objects.all()
-    algorithms = [a.to_dict() for a in algorithms]
+    Results are stored with naive local timestamps, so aware times are
+    converted to local time before their offset is dropped.
+    """
+    try:
+        return datetime.datetime.fromtimestamp(float(value))
+    except ValueError:
+        pass
+    if value.endswith(('Z', 'z')):
+        value = value[:-1] + '+00:00'
+    ts = datetime.datetime.fromisoformat(value)
+    if ts.tzinfo is not None:
+        ts = ts.astimezone().replace(tzinfo=None)
+    return ts
+
+def _get_time_range():
+    """Return ((start, end), error) from the start/end query arguments.
+
+    Either may be an ISO 8601 time or epoch seconds; the range defaults to
+    the last RESULT_QUERY_RANGE_DEFAULT seconds.
+    """
+    try:
+        end = _parse_time(request.args['end']) \
+            if 'end' in request.args else datetime.datetime.now()
+        start = _parse_time(request.args['start']) \
+            if 'start' in request.args else \
+            end - datetime.timedelta(seconds=RESULT_QUERY_RANGE_DEFAULT)
+    except (ValueError, TypeError, OverflowError, OSError) as e:
+        return None, _build_error(400, "Invalid time: %s" % e)
+    if start >= end:
+        return None, _build_error(400, "start must be before end")
+    return (start, end), None
+
+def _get_aggregation(camera_id=None, by_camera=True):
+    time_range, error = _get_time_range()
+    if error:
+        return None, error
+    try:
+        interval = int(request.args.get('interval', RESULT_BUCKET_SECONDS))
+        rows = result_store.aggregate(
+            time_range[0], time_range[1], interval,
+            camera_id=camera_id,
+            algorithm=request.args.get('algorithm'),
+            by_camera=by_camera
+        )
+    except ValueError as e:
+        return None, _build_error(400, e.__str__())
+    return rows, None
+
+@api.route('/api/cameras/<string:camera_id>/results', methods=['GET'])
+def get_camera_results(camera_id):
+    camera, error = _get_camera_by_id(camera_id, fields=['id'])
+    if error:
+        return utils.make_json_response(**error)
+    time_range, error = _get_time_range()
+    if error:
+        return utils.make_json_response(**error)
+    params, error = _get_list_params(())
+    if error:
+        return utils.make_json_response(**error)
     return utils.make_json_response(
         200,
-        algorithms
+        result_store.query(
+            camera.id, time_range[0], time_range[1],
+            algorithm=request.args.get('algorithm'),
+            limit=params['limit'] or LIST_PAGE_MAX
+        )
     )
 
+@api.route('/api/cameras/<string:camera_id>/results/aggregate',
+           methods=['GET'])
+def aggregate_camera_results(camera_id):
+    camera, error = _get_camera_by_id(camera_id, fields=['id'])
+    if error:
+        return utils.make_json_response(**error)
+    rows, error = _get_aggregation(camera.id, by_camera=False)
+    if error:
+        return utils.make_json_response(**error)
+    return utils.make_json_response(200, rows)
+
+@api.route('/api/results/aggregate', methods=['GET'])
+def aggregate_results():
+    """Fleet-wide result counts; by=camera keeps one row per camera."""
+    by = request.args.get('by', 'algorithm')
+    if by not in ('algorithm', 'camera'):
+        return utils.make_json_response(400, "by must be algorithm or camera")
+    rows, error = _get_aggregation(by_camera=(by == 'camera'))
+    if error:
+        return utils.make_json_response(**error)
+    return utils.make_json_response(200, rows)
+
+@api.route('/api/cameras/<string:camera_id>/suppressed', methods=['GET'])
+def get_suppressed_results(camera_id):
+    camera, error = _get_camera_by_id(camera_id, fields=['id'])
+    if error:
+        return utils.make_json_response(**error)
+    return utils.make_json_response(
+        200,
+        {
+            "id": str(camera.id),
+            "suppressed": result_debouncer.suppressed(camera.id)
+        }
+    )
+
+def _apply_algorithm_results(camera, data):
+    """Put the reported algorithms in cooldown and run their actions.
+
+    Running algorithms are reactivated (stopped, then made idle) once their
+    cooldown has passed. Results of algorithms the camera does not run are
+    ignored, so they never reach algorithm_status or the result store.
+
+    Returns the per-algorithm action outcomes, the algorithms whose result
+    was dropped by the debouncer and the unknown algorithms.
+    """
+    rules = rule_cache.get(
+        camera.id,
+        profile_cache.version(camera),
+        lambda: profile_cache.resolve(
+            camera,
+            models.Camera.objects.only('action_dict').get(
+                id=camera.id
+            ).action_dict
+        )
+    )
+    unknown = [a for a in data if a not in rules.algorithms]
+    if unknown:
+        logging.warning(
+            'Ignoring results of unknown algorithms %s of camera %s',
+            ', '.join(unknown), camera.id
+        )
+        data = {a: r for a, r in data.items() if a in rules.algorithms}
+    outcomes = {}
+    suppressed = []
+    for algorithm, result in data.items():
+        if camera.set_algorithm_status(
+            algorithm, 'cooldown', expected=['running']
+        ):
+            event_bus.publish(
+                'status', camera.id, algorithm=algorithm, status='cooldown'
+            )
+            cooldown_scheduler.schedule(
+                cooldown_scheduler.get_cooldown(algorithm),
+                _reactivate_algorithm,
+                camera.id,
+                algorithm
+            )
+        if result_debouncer.allow(camera.id, algorithm, result):
+            action_invoker = ActionInvoker(
+                camera.id
+            )
+            outcomes[algorithm] = action_invoker.invoke_actions(
+                list(rules.match(algorithm, result))
+            )
+            event_bus.publish(
+                'result', camera.id, algorithm=algorithm, result=result,
+                actions=outcomes[algorithm]
+            )
+        else:
+            suppressed.append(algorithm)
+    if not data:
+        return outcomes, suppressed, unknown
+    response_cache.invalidate('cameras')
+    if RESULT_STORE_ENABLED:
+        try:
+            result_store.record(camera.id, data, suppressed)
+        except Exception:
+            logging.exception('Cannot store results of camera %s', camera.id)
+    return outcomes, suppressed, unknown
+
+def _process_queued_results(camera_id, results):
+    try:
+        camera = models.Camera.objects.only('last_updated', 'profile').get(
+            id=camera_id
+        )
+    except models.Camera.DoesNotExist:
+        logging.warning(
+            'Dropping %d results of deleted camera %s', len(results), camera_id
+        )
+        return
+    for data in results:
+        _apply_algorithm_results(camera, data)
+
+result_queue = ResultQueue(RESULT_QUEUE_PATH, _process_queued_results)
+
+def _reap_algorithm(camera, algorithm):
+    logging.warning(
+        'Lease of algorithm %s of camera %s expired', algorithm, camera.id
+    )
+    _reactivate_algorithm(camera.id, algorithm)
+
+lease_reaper = LeaseReaper(_reap_algorithm)
+
+def _scheduled_trigger(camera):
+    action_dict = profile_cache.resolve(camera)
+    if action_dict:
+        _trigger_camera(camera, action_dict)
+
+trigger_scheduler = TriggerScheduler(
+    _scheduled_trigger, profile_cache.trigger_interval, admission.check
+)
+metrics.registry.gauge(
+    'camera_cloud_scheduled_triggers_due',
+    'Scheduled camera triggers that are due and not yet dispatched.',
+    lambda: trigger_scheduler.due
+)
+metrics.registry.gauge(
+    'camera_cloud_scheduled_trigger_lag_max_seconds',
+    'How long the oldest due scheduled trigger has been waiting.',
+    lambda: trigger_scheduler.lag
+)
+metrics.registry.gauge(
+    'camera_cloud_scheduled_triggers_inflight',
+    'Scheduled camera triggers currently starting algorithms.',
+    lambda: trigger_scheduler.inflight
+)
+
+admission.add_probe(
+    'rpyc',
+    lambda: sum(pool.waiting for pool in get_pools()),
+    ADMISSION_MAX_RPYC_WAITING
+)
+admission.add_probe(
+    'celery', inflight_publishes, ADMISSION_MAX_CELERY_INFLIGHT
+)
+
+if RESULT_INGESTION_MODE == 'queue':
+    admission.add_probe(
+        'result_queue',
+        result_queue.approximate_depth,
+        ADMISSION_MAX_RESULT_BACKLOG
+    )
+    metrics.registry.gauge(
+        'camera_cloud_result_queue_depth',
+        'Algorithm results waiting in the ingestion queue.',
+        result_queue.depth
+    )
+    metrics.registry.gauge(
+        'camera_cloud_result_queue_events_total',
+        'Algorithm results enqueued, processed, failed and dropped.',
+        lambda: {(k,): v for k, v in result_queue.stats.items()},
+        labels=('event',),
+        metric_type='counter'
+    )
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    resp = make_response(metrics.registry.render(), 200)
+    resp.headers['Content-type'] = 'text/plain; version=0.0.4'
+    return resp
+
+
+@api.route('/api/workers', methods=['GET'])
+def list_workers():
+    return utils.make_json_response(200, worker_registry.workers())
+
+
+@api.route('/api/algorithms', methods=['GET'])
+@cached_response('algorithms', _list_validator(models.Algorithm))
+def list_algorithms():
+    params, error = _get_list_params(ALGORITHM_LIST_FIELDS)
+    if error:
+        return utils.make_json_response(**error)
+    algorithms, next_cursor, error = _list_documents(
+        models.Algorithm.objects.all(), CATALOG_LIST_ORDER, params
+    )
+    if error:
+        return utils.make_json_response(**error)
+    return _make_list_response(algorithms, next_cursor)
+
 @api.route('/api/algorithms', methods=['POST'])
 def create_algorithm():
     data = utils.get_request_data()
@@ -363,20 +1274,25 @@ def create_algorithm():
             409,
             e.__str__()
         )
+    catalog_cache.invalidate()
+    response_cache.invalidate('algorithms')
     return utils.make_json_response(
         200,
         algorithm.to_dict()
     )
 
 @api.route('/api/algorithms/<string:algorithm_id>', methods=['GET'])
+@cached_response('algorithms')
 def get_algorithm(algorithm_id):
     algorithm, error = _get_algorithm_by_id(algorithm_id)
     if error:
         return utils.make_json_response(**error)
-    return utils.make_json_response(
+    resp = utils.make_json_response(
         200,
         algorithm.to_dict()
     )
+    resp.last_modified = algorithm.last_updated
+    return resp
 
 @api.route('/api/algorithms/<string:algorithm_id>', methods=['PUT'])
 def update_algorithm(algorithm_id):
@@ -394,6 +1310,8 @@ def update_algorithm(algorithm_id):
     for k, v in data.items():
         setattr(algorithm, k, v)
     algorithm.save()
+    catalog_cache.invalidate()
+    response_cache.invalidate('algorithms')
     return utils.make_json_response(
         200,
         algorithm.to_dict()
@@ -406,6 +1324,8 @@ def delete_algorithm(algorithm_id):
         return utils.make_json_response(**error)
     algorithm_name = algorithm.name
     algorithm.delete()
+    catalog_cache.invalidate()
+    response_cache.invalidate('algorithms')
     return utils.make_json_response(
         200,
         {
@@ -415,13 +1335,17 @@ def delete_algorithm(algorithm_id):
     )
 
 @api.route('/api/actions', methods=['GET'])
+@cached_response('actions', _list_validator(models.Action))
 def list_actions():
-    actions = models.Action.objects.all()
-    actions = [a.to_dict() for a in actions]
-    return utils.make_json_response(
-        200,
-        actions
+    params, error = _get_list_params(ACTION_LIST_FIELDS)
+    if error:
+        return utils.make_json_response(**error)
+    actions, next_cursor, error = _list_documents(
+        models.Action.objects.all(), CATALOG_LIST_ORDER, params
     )
+    if error:
+        return utils.make_json_response(**error)
+    return _make_list_response(actions, next_cursor)
 
 @api.route('/api/actions', methods=['POST'])
 def create_action():
@@ -448,20 +1372,25 @@ def create_action():
             409,
             e.__str__()
         )
+    catalog_cache.invalidate()
+    response_cache.invalidate('actions')
     return utils.make_json_response(
         200,
         action.to_dict()
     )
 
 @api.route('/api/actions/<string:action_id>', methods=['GET'])
+@cached_response('actions')
 def get_action(action_id):
     action, error = _get_action_by_id(action_id)
     if error:
         return utils.make_json_response(**error)
-    return utils.make_json_response(
+    resp = utils.make_json_response(
         200,
         action.to_dict()
     )
+    resp.last_modified = action.last_updated
+    return resp
 
 @api.route('/api/actions/<string:action_id>', methods=['PUT'])
 def update_action(action_id):
@@ -479,6 +1408,8 @@ def update_action(action_id):
     for k, v in data.items():
         setattr(action, k, v)
     action.save()
+    catalog_cache.invalidate()
+    response_cache.invalidate('actions')
     return utils.make_json_response(
         200,
         action.to_dict()
@@ -491,6 +1422,8 @@ def delete_action(action_id):
         return utils.make_json_response(**error)
     action_name = action.name
     action.delete()
+    catalog_cache.invalidate()
+    response_cache.invalidate('actions')
     return utils.make_json_response(
         200,
         {
@@ -498,3 +1431,130 @@ def delete_action(action_id):
             "status": "deleted"
         }
     )
+
+@api.route('/api/profiles', methods=['GET'])
+@cached_response('profiles', _list_validator(models.RuleProfile))
+def list_profiles():
+    params, error = _get_list_params(PROFILE_LIST_FIELDS)
+    if error:
+        return utils.make_json_response(**error)
+    profiles, next_cursor, error = _list_documents(
+        models.RuleProfile.objects.all(), CATALOG_LIST_ORDER, params
+    )
+    if error:
+        return utils.make_json_response(**error)
+    return _make_list_response(profiles, next_cursor)
+
+@api.route('/api/profiles', methods=['POST'])
+def create_profile():
+    data = utils.get_request_data()
+    if not (set(data.keys()) <= set(CREATE_PROFILE_FIELDS)):
+        return utils.make_json_response(
+            400,
+            "Invalid parameter keys: %s" %
+                str(set(data.keys()) - set(CREATE_PROFILE_FIELDS))
+        )
+    actions, errors = _validate_camera_actions(data.pop('actions', {}))
+    if errors:
+        return utils.make_json_response(
+            400,
+            errors
+        )
+    data['trigger_interval'], error = _get_trigger_interval(
+        data.get('trigger_interval')
+    )
+    if error:
+        return utils.make_json_response(**error)
+    profile = models.RuleProfile(action_dict=actions)
+    for k, v in data.items():
+        setattr(profile, k, v)
+    try:
+        profile.save()
+    except mongoengine.errors.NotUniqueError as e:
+        return utils.make_json_response(
+            409,
+            e.__str__()
+        )
+    response_cache.invalidate('profiles')
+    return utils.make_json_response(
+        200,
+        profile.to_dict()
+    )
+
+@api.route('/api/profiles/<string:profile_id>', methods=['GET'])
+@cached_response('profiles')
+def get_profile(profile_id):
+    profile, error = _get_profile_by_id(profile_id)
+    if error:
+        return utils.make_json_response(**error)
+    resp = utils.make_json_response(
+        200,
+        profile.to_dict()
+    )
+    resp.last_modified = profile.last_updated
+    return resp
+
+@api.route('/api/profiles/<string:profile_id>', methods=['PUT'])
+def update_profile(profile_id):
+    """Update a profile; every camera using it picks up the new rules."""
+    data = utils.get_request_data()
+
+    if not (set(data.keys()) <= set(UPDATE_PROFILE_FIELDS)):
+        return utils.make_json_response(
+            400,
+            "Invalid parameter keys: %s" %
+                str(set(data.keys()) - set(UPDATE_PROFILE_FIELDS))
+        )
+    profile, error = _get_profile_by_id(profile_id)
+    if error:
+        return utils.make_json_response(**error)
+    if 'actions' in data.keys():
+        actions, errors = _validate_camera_actions(data.pop('actions'))
+        if errors:
+            return utils.make_json_response(
+                400,
+                errors
+            )
+        profile.action_dict = actions
+    if 'trigger_interval' in data.keys():
+        data['trigger_interval'], error = _get_trigger_interval(
+            data['trigger_interval']
+        )
+        if error:
+            return utils.make_json_response(**error)
+    reschedule = 'trigger_interval' in data.keys() and \
+        data['trigger_interval'] != profile.trigger_interval
+    for k, v in data.items():
+        setattr(profile, k, v)
+    profile.save()
+    profile_cache.invalidate(profile.id)
+    response_cache.invalidate('profiles')
+    if reschedule:
+        reschedule_profile(profile.id, profile.trigger_interval)
+    return utils.make_json_response(
+        200,
+        profile.to_dict()
+    )
+
+@api.route('/api/profiles/<string:profile_id>', methods=['DELETE'])
+def delete_profile(profile_id):
+    profile, error = _get_profile_by_id(profile_id)
+    if error:
+        return utils.make_json_response(**error)
+    in_use = models.Camera.objects(profile=profile.id).count()
+    if in_use:
+        return utils.make_json_response(
+            409,
+            "Profile is used by %d cameras" % in_use
+        )
+    profile_name = profile.name
+    profile.delete()
+    profile_cache.invalidate(profile.id)
+    response_cache.invalidate('profiles')
+    return utils.make_json_response(
+        200,
+        {
+            "name": profile_name,
+            "status": "deleted"
+        }
+    )
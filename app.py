@@ -6,8 +6,10 @@ from flask_principal import Principal
 
 from config import *
 
-from api import api
-from models.models import db
+# Registers the MongoDB command listener before any client is created.
+import metrics
+from api import api, result_queue, lease_reaper, trigger_scheduler
+from models.models import db, ensure_indexes
 
 
 principals = Principal()
@@ -23,6 +25,19 @@ def create_app(config_name):
     db.init_app(app)
     principals.init_app(app)
 
+    if app.config.get('ENSURE_INDEXES'):
+        ensure_indexes()
+
+    # Resume draining results left in the queue by a previous run.
+    if RESULT_INGESTION_MODE == 'queue':
+        result_queue.start()
+
+    if LEASE_REAP_INTERVAL:
+        lease_reaper.start()
+
+    if TRIGGER_SCHEDULER_ENABLED:
+        trigger_scheduler.start()
+
     return app
 
 app = create_app(os.getenv('config') or 'default')
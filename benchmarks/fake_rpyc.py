@@ -0,0 +1,46 @@
+"""Fake RPyC algorithm/action server with a configurable call latency."""
+import argparse
+import time
+
+import rpyc
+from rpyc.utils.server import ThreadedServer
+
+
+class FakeAlgorithmService(rpyc.Service):
+    latency = 0.0
+    # (call, name) of every RPC when set to a list.
+    calls = None
+
+    def _call(self, call, name):
+        if self.calls is not None:
+            self.calls.append((call, name))
+        time.sleep(self.latency)
+
+    def exposed_run_algorithm(self, algorithm, json_str):
+        self._call('run_algorithm', algorithm)
+        return 'started'
+
+    def exposed_stop_and_delete_instance(self, algorithm):
+        self._call('stop_and_delete_instance', algorithm)
+        return 'stopped'
+
+    def exposed_run_action(self, action, json_str):
+        self._call('run_action', action)
+        return 'done'
+
+
+def serve(port, latency=0.0, calls=None):
+    """Serve until killed; RPCs are appended to `calls` if it is a list."""
+    service = type('FakeAlgorithmService', (FakeAlgorithmService,), {
+        'latency': latency, 'calls': calls
+    })
+    ThreadedServer(service, port=port).start()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=18813)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds every RPC sleeps')
+    args = parser.parse_args()
+    serve(args.port, args.latency)
@@ -0,0 +1,226 @@
+"""Load test of the trigger, result and agent_start routes per serving mode.
+
+Starts the fake RPyC server, then for every requested mode and result
+ingestion mode serves benchmarks.stub_app, seeds it with cameras and
+hammers it from concurrent clients. Prints requests per second and latency
+percentiles as JSON; queue ingestion also reports how long the result
+queue took to drain once the load stopped.
+
+    python -m benchmarks.loadtest --modes threaded,gevent --duration 10
+    python -m benchmarks.loadtest --modes threaded --ingestion inline,queue
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ('trigger', 'result', 'agent_start')
+
+
+def server_command(mode, port, workers):
+    if mode == 'threaded':
+        return [
+            sys.executable, '-c',
+            'from benchmarks.stub_app import app; '
+            'app.run(port=%d, threaded=True)' % port
+        ]
+    if mode == 'gevent':
+        return [
+            sys.executable, '-m', 'gunicorn',
+            '-c', os.path.join(ROOT, 'gunicorn_config.py'),
+            '-b', '127.0.0.1:%d' % port, '-w', str(workers),
+            '--access-logfile', '/dev/null',
+            'benchmarks.stub_app:app'
+        ]
+    raise ValueError('unknown mode: %s' % mode)
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('nothing listening on port %d' % port)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Client(object):
+    def __init__(self, port):
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+
+    def request(self, method, path, data=None):
+        body = json.dumps(data) if data is not None else None
+        self.conn.request(method, path, body,
+                          {'Content-Type': 'application/json'})
+        resp = self.conn.getresponse()
+        payload = resp.read()
+        return resp.status, payload
+
+
+def queue_depth(port):
+    status, payload = Client(port).request('GET', '/metrics')
+    for line in payload.decode().splitlines():
+        if line.startswith('camera_cloud_result_queue_depth '):
+            return float(line.split()[1])
+    raise RuntimeError('result queue depth is not exported')
+
+
+def wait_for_drain(port, timeout=600):
+    """Return the seconds the result queue took to empty."""
+    started = time.time()
+    while queue_depth(port) > 0:
+        if time.time() - started > timeout:
+            raise RuntimeError('result queue not drained in %ds' % timeout)
+        time.sleep(0.1)
+    return round(time.time() - started, 2)
+
+
+def seed(port, cameras):
+    client = Client(port)
+    client.request('POST', '/api/algorithms',
+                   {'name': 'bench_algo', 'options': ['person', 'car']})
+    client.request('POST', '/api/actions',
+                   {'name': 'bench_notify', 'params': {}})
+    actions = {'bench_algo': {'person': [
+        {'action': 'bench_notify', 'params': {}}
+    ]}}
+    ids = []
+    for start in range(0, cameras, 500):
+        status, payload = client.request('POST', '/api/cameras/bulk', {
+            'cameras': [
+                {'name': 'bench-%d' % i, 'actions': actions}
+                for i in range(start, min(cameras, start + 500))
+            ]
+        })
+        if status != 200:
+            raise RuntimeError('seeding failed: %s' % payload[:200])
+        ids.extend(c['id'] for c in json.loads(payload))
+    return ids
+
+
+def run_load(port, camera_ids, duration, concurrency):
+    latencies = {e: [] for e in ENDPOINTS}
+    errors = {e: 0 for e in ENDPOINTS}
+    lock = threading.Lock()
+    cameras = itertools.cycle(camera_ids)
+    deadline = time.time() + duration
+
+    def worker():
+        client = Client(port)
+        steps = itertools.cycle(ENDPOINTS)
+        while time.time() < deadline:
+            endpoint = next(steps)
+            with lock:
+                camera_id = next(cameras)
+            path = '/api/cameras/%s/%s' % (camera_id, endpoint)
+            data = {'bench_algo': 'person'} if endpoint == 'result' else None
+            started = time.time()
+            try:
+                status, _ = client.request('POST', path, data)
+            except (OSError, http.client.HTTPException):
+                status = None
+                client = Client(port)
+            elapsed = time.time() - started
+            with lock:
+                if status is None or status >= 400:
+                    errors[endpoint] += 1
+                else:
+                    latencies[endpoint].append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    report = {}
+    for endpoint in ENDPOINTS:
+        values = latencies[endpoint]
+        report[endpoint] = {
+            'requests': len(values),
+            'errors': errors[endpoint],
+            'rps': round(len(values) / float(duration), 1),
+            'p50_ms': round(percentile(values, 0.50) * 1000, 2)
+                if values else None,
+            'p99_ms': round(percentile(values, 0.99) * 1000, 2)
+                if values else None,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--modes', default='threaded,gevent')
+    parser.add_argument('--ingestion', default='inline',
+                        help='result ingestion modes, e.g. inline,queue')
+    parser.add_argument('--cameras', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='gunicorn workers (needs BENCH_MONGO_HOST if >1)')
+    parser.add_argument('--rpyc-latency', type=float, default=0.01)
+    parser.add_argument('--rpyc-port', type=int, default=18813)
+    parser.add_argument('--port', type=int, default=9998)
+    args = parser.parse_args()
+
+    env = dict(os.environ, BENCH_RPYC_PORT=str(args.rpyc_port))
+    rpyc_server = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.fake_rpyc',
+         '--port', str(args.rpyc_port), '--latency', str(args.rpyc_latency)],
+        cwd=ROOT, env=env
+    )
+    results = {}
+    try:
+        wait_for_port(args.rpyc_port)
+        for mode, ingestion in itertools.product(
+                args.modes.split(','), args.ingestion.split(',')):
+            queue_dir = tempfile.TemporaryDirectory()
+            server = subprocess.Popen(
+                server_command(mode, args.port, args.workers),
+                cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                env=dict(
+                    env, RESULT_INGESTION_MODE=ingestion,
+                    RESULT_QUEUE_PATH=os.path.join(
+                        queue_dir.name, 'results.sqlite'
+                    )
+                )
+            )
+            try:
+                wait_for_port(args.port)
+                camera_ids = seed(args.port, args.cameras)
+                report = run_load(
+                    args.port, camera_ids, args.duration, args.concurrency
+                )
+                if ingestion == 'queue':
+                    report['result']['drain_s'] = wait_for_drain(args.port)
+            finally:
+                server.terminate()
+                server.wait()
+                queue_dir.cleanup()
+            key = mode if ingestion == 'inline' else '%s/%s' % (mode, ingestion)
+            results[key] = report
+    finally:
+        rpyc_server.terminate()
+        rpyc_server.wait()
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,444 @@
+"""Benchmark suite for the API hot paths.
+
+Drives the Flask test client of benchmarks.stub_app (mongomock or a local
+mongod, kombu's in-memory Celery transport) with a fake RPyC server running
+in a background thread, and prints the timings as JSON so runs on different
+commits can be compared:
+
+    python -m benchmarks.run --output before.json
+    python -m benchmarks.run --compare before.json
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+
+def _free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def start_fake_rpyc(latency, calls=None):
+    from benchmarks.fake_rpyc import serve
+    port = _free_port()
+    thread = threading.Thread(target=serve, args=(port, latency, calls))
+    thread.daemon = True
+    thread.start()
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 1).close()
+            return port
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('fake RPyC server did not start')
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    ms = lambda v: round(v * 1000, 3)
+    return {
+        'n': len(samples),
+        'mean_ms': ms(sum(samples) / len(samples)),
+        'min_ms': ms(samples[0]),
+        'p50_ms': ms(samples[len(samples) // 2]),
+        'p95_ms': ms(samples[min(len(samples) - 1,
+                                 int(len(samples) * 0.95))]),
+    }
+
+
+def _legacy_validate_camera_actions(actions):
+    """The checks of api._validate_camera_actions as they were before the
+    catalog cache, kept as the baseline of the validation benchmark."""
+    from models import models
+    all_algorithm_objs = models.Algorithm.objects.all()
+    all_action_objs = models.Action.objects.all()
+    all_algorithms = [a.name for a in all_algorithm_objs]
+    all_actions = [a.name for a in all_action_objs]
+    all_options = ['else']
+    for algo_obj in all_algorithm_objs:
+        all_options.extend(algo_obj.options)
+    errors = [a for a in actions.keys() if a not in all_algorithms]
+    for option_rules in actions.values():
+        errors.extend(set(option_rules.keys()) - set(all_options))
+        for rules in option_rules.values():
+            for f in rules:
+                if f['action'] not in all_actions:
+                    errors.append(f['action'])
+                    continue
+                params = list(filter(
+                    lambda x: x.name == f['action'], all_action_objs
+                ))[0].params
+                required = set(
+                    k for k, v in params.items() if v['required'] == 'true'
+                )
+                errors.extend(set(f['params']) - set(params))
+                errors.extend(required - set(f['params']))
+    if errors:
+        return None, 'Invalid actions: %s' % errors
+    return actions, None
+
+
+def measure(func, repeat, setup=None):
+    samples = []
+    for i in range(repeat):
+        if setup is not None:
+            setup(i)
+        started = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def check(resp, *statuses):
+    data = resp.get_data()
+    if resp.status_code not in (statuses or (200,)):
+        raise RuntimeError('%s: %s' % (resp.status_code, data[:200]))
+    return data
+
+
+class Suite(object):
+    ALGORITHM = 'bench_algo'
+    ACTION = 'bench_notify'
+
+    def __init__(self, repeat):
+        from benchmarks.stub_app import app
+        import api
+        from catalog import catalog_cache
+        from models import models
+        from response_cache import response_cache
+        self.api = api
+        self.models = models
+        self.catalog_cache = catalog_cache
+        self.response_cache = response_cache
+        self.client = app.test_client()
+        self.repeat = repeat
+
+    def reset(self):
+        for document in (self.models.Camera, self.models.Algorithm,
+                         self.models.Action):
+            document.drop_collection()
+        self.catalog_cache.invalidate()
+        self.models.Algorithm(
+            name=self.ALGORITHM, options=['person', 'car']
+        ).save()
+        self.models.Action(
+            name=self.ACTION,
+            params={'to': {'type': 'string', 'required': 'false'}}
+        ).save()
+
+    def action_dict(self, actions=1, algorithms=(ALGORITHM,)):
+        return {
+            algorithm: {'person': [
+                {'action': self.ACTION, 'params': {'to': 'ops'}}
+            ] * actions}
+            for algorithm in algorithms
+        }
+
+    def insert_cameras(self, count):
+        now = datetime.datetime.now()
+        action_dict = self.action_dict()
+        for start in range(0, count, 1000):
+            self.models.Camera.objects.insert([
+                self.models.Camera(
+                    name='cam-%d' % i,
+                    action_dict=action_dict,
+                    algorithm_status={self.ALGORITHM: 'idle'},
+                    streaming_url='rtmp://bench/cam-%d' % i,
+                    last_updated=now
+                )
+                for i in range(start, min(count, start + 1000))
+            ], load_bulk=False)
+
+    def register_camera(self):
+        self.reset()
+        action_dict = self.action_dict()
+        return measure(
+            lambda i: check(self.client.post('/api/cameras', json={
+                'name': 'reg-%d' % i, 'actions': action_dict
+            })),
+            self.repeat
+        )
+
+    def list_cameras(self, size):
+        self.reset()
+        self.insert_cameras(size)
+        repeat = max(1, min(self.repeat, 200000 // max(size, 1)))
+        return {
+            'full': measure(
+                lambda i: check(self.client.get('/api/cameras')), repeat
+            ),
+            'page_100': measure(
+                lambda i: check(self.client.get('/api/cameras?limit=100')),
+                self.repeat
+            ),
+        }
+
+    def _traced_get(self, path):
+        """Peak memory allocated while serving and reading one response."""
+        self.response_cache.invalidate('cameras')
+        gc.collect()
+        tracemalloc.start()
+        try:
+            resp = self.client.get(path, buffered=False)
+            body = 0
+            for chunk in resp.iter_encoded():
+                body += len(chunk)
+            resp.close()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return {'peak_kb': round(peak / 1024.0, 1),
+                'body_kb': round(body / 1024.0, 1)}
+
+    def list_cameras_memory(self, size):
+        """Peak memory of a full list_cameras, streamed and buffered."""
+        self.reset()
+        self.insert_cameras(size)
+        streamed = self.api.STREAM_LIST_RESPONSES
+        results = {}
+        try:
+            for mode, enabled in (('streamed', True), ('buffered', False)):
+                self.api.STREAM_LIST_RESPONSES = enabled
+                results[mode] = self._traced_get('/api/cameras')
+        finally:
+            self.api.STREAM_LIST_RESPONSES = streamed
+        return results
+
+    def validate_camera_actions(self, catalog_size, referenced):
+        """Validation against a catalog of `catalog_size` actions, before
+        (loading every document and scanning them per referenced action)
+        and after (the cached, name-indexed catalog, warm and cold)."""
+        self.reset()
+        self.models.Action.objects.insert([
+            self.models.Action(
+                name='action-%d' % i,
+                params={'to': {'type': 'string', 'required': 'true'}}
+            ) for i in range(catalog_size)
+        ], load_bulk=False)
+        actions = {self.ALGORITHM: {'person': [
+            {'action': 'action-%d' % (i * catalog_size // referenced),
+             'params': {'to': 'ops'}}
+            for i in range(referenced)
+        ]}}
+        for validate in (_legacy_validate_camera_actions,
+                         self.api._validate_camera_actions):
+            _, error = validate(actions)
+            if error:
+                raise RuntimeError(error)
+        return {
+            'before': measure(
+                lambda i: _legacy_validate_camera_actions(actions),
+                max(1, min(self.repeat, 20))
+            ),
+            'cached': measure(
+                lambda i: self.api._validate_camera_actions(actions),
+                self.repeat
+            ),
+            'cache_miss': measure(
+                lambda i: self.api._validate_camera_actions(actions),
+                max(1, min(self.repeat, 20)),
+                setup=lambda i: self.catalog_cache.invalidate()
+            ),
+        }
+
+    def serialize_cameras(self, count):
+        import simplejson
+        import serializer
+        from bson import ObjectId
+        now = datetime.datetime.now()
+        cameras = [{
+            'id': ObjectId(),
+            'name': 'cam-%d' % i,
+            'streaming_url': 'rtmp://bench/cam-%d' % i,
+            'action_dict': self.action_dict(actions=3),
+            'algorithm_status': {self.ALGORITHM: 'idle'},
+            'last_updated': now,
+        } for i in range(count)]
+        return {
+            serializer.BACKEND: measure(
+                lambda i: serializer.dumps(cameras), self.repeat
+            ),
+            'simplejson': measure(
+                lambda i: simplejson.dumps(cameras, default=str),
+                self.repeat
+            ),
+        }
+
+    def _camera(self, action_dict):
+        camera = self.models.Camera(
+            name='hot', action_dict=action_dict, streaming_url='rtmp://x/hot'
+        )
+        camera.save()
+        return camera
+
+    def trigger_camera_algorithm(self, algorithms):
+        self.reset()
+        names = ['algo-%d' % i for i in range(algorithms)]
+        for name in names:
+            self.models.Algorithm(name=name, options=['person']).save()
+        camera = self._camera(self.action_dict(algorithms=names))
+        idle = {name: 'idle' for name in names}
+        return measure(
+            lambda i: check(self.client.post(
+                '/api/cameras/%s/trigger' % camera.id
+            )),
+            self.repeat,
+            setup=lambda i: self.models.Camera.objects(id=camera.id).update(
+                set__algorithm_status=idle
+            )
+        )
+
+    def update_algorithm_result(self, actions):
+        self.reset()
+        camera = self._camera(self.action_dict(actions=actions))
+        return measure(
+            lambda i: check(self.client.post(
+                '/api/cameras/%s/result' % camera.id,
+                json={self.ALGORITHM: 'person'}
+            ), 200, 202),
+            self.repeat
+        )
+
+    def notify_agent_start(self, count):
+        """Agent start messages for `count` cameras, published one by one
+        with plain send_task (the original path), per camera through the
+        notifier, and in one pass with notify_agent_start_many."""
+        from bson import ObjectId
+        from camera_notifier.notifier import CameraNotifier, \
+            notify_agent_start_many
+        from celery_utils import client as celery_client
+        cameras = [
+            (ObjectId(), 'rtmp://bench/cam-%d' % i) for i in range(count)
+        ]
+        repeat = max(1, min(self.repeat, 20000 // max(count, 1)))
+
+        def send_task(i):
+            for camera_id, url in cameras:
+                celery_client.celery.send_task(
+                    'notify_agent_start', (url, str(camera_id)),
+                    queue=str(camera_id)
+                )
+
+        def per_camera(i):
+            for camera_id, url in cameras:
+                CameraNotifier(camera_id, url).notify_agent_start()
+
+        return {
+            'send_task': measure(send_task, repeat),
+            'per_camera': measure(per_camera, repeat),
+            'batched': measure(
+                lambda i: notify_agent_start_many(cameras), repeat
+            ),
+        }
+
+    def run(self, sizes, catalog_sizes, action_counts, notify_counts):
+        results = {'register_camera': self.register_camera()}
+        for size in sizes:
+            results['list_cameras[%d]' % size] = self.list_cameras(size)
+        for size in sizes:
+            results['list_cameras_memory[%d]' % size] = \
+                self.list_cameras_memory(size)
+        for size in sizes:
+            results['serialize_cameras[%d]' % size] = \
+                self.serialize_cameras(size)
+        for size in catalog_sizes:
+            results['validate_camera_actions[%d]' % size] = \
+                self.validate_camera_actions(size, 100)
+        results['trigger_camera_algorithm[10]'] = \
+            self.trigger_camera_algorithm(10)
+        for count in action_counts:
+            results['update_algorithm_result[%d]' % count] = \
+                self.update_algorithm_result(count)
+        for count in notify_counts:
+            results['notify_agent_start[%d]' % count] = \
+                self.notify_agent_start(count)
+        return results
+
+
+def _flatten(results, prefix=''):
+    for name, value in results.items():
+        if not isinstance(value, dict):
+            continue
+        if 'mean_ms' in value:
+            yield prefix + name, value['mean_ms']
+        else:
+            for item in _flatten(value, prefix + name + '.'):
+                yield item
+
+
+def compare(baseline, results, threshold):
+    """Return the benchmarks whose mean got slower than `threshold`."""
+    old = dict(_flatten(baseline['results']))
+    regressions = {}
+    for name, mean in _flatten(results):
+        if name in old and old[name] and \
+                (mean - old[name]) / old[name] > threshold:
+            regressions[name] = {'before_ms': old[name], 'after_ms': mean}
+    return regressions
+
+
+def _ints(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--sizes', type=_ints, default=[10, 1000, 50000],
+                        help='camera counts for list_cameras')
+    parser.add_argument('--catalog-sizes', type=_ints, default=[100, 5000])
+    parser.add_argument('--action-counts', type=_ints, default=[1, 100])
+    parser.add_argument('--notify-counts', type=_ints, default=[1, 500],
+                        help='cameras per agent start publishing round')
+    parser.add_argument('--rpyc-latency', type=float, default=0.0)
+    parser.add_argument('--output', help='write the JSON report here')
+    parser.add_argument('--compare', help='baseline JSON report')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative slowdown reported as a regression')
+    args = parser.parse_args()
+
+    os.environ['BENCH_RPYC_PORT'] = str(start_fake_rpyc(args.rpyc_latency))
+    results = Suite(args.repeat).run(
+        args.sizes, args.catalog_sizes, args.action_counts,
+        args.notify_counts
+    )
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], universal_newlines=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    report = {
+        'commit': commit,
+        'python': platform.python_version(),
+        'results': results,
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            report['regressions'] = compare(
+                json.load(f), results, args.threshold
+            )
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+    if report.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
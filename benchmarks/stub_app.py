@@ -0,0 +1,45 @@
+"""Camera cloud app wired to local stand-ins, for benchmarks only.
+
+MongoDB is replaced by mongomock unless BENCH_MONGO_HOST points at a real
+mongod, Celery publishes to kombu's in-memory transport and RPyC calls go to
+the fake server of benchmarks/fake_rpyc.py listening on BENCH_RPYC_PORT.
+mongomock lives inside one process, so serve this app with a single worker
+unless a real mongod is used.
+"""
+import os
+import sys
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+import config
+
+MONGO_HOST = os.environ.get('BENCH_MONGO_HOST', 'mongomock://localhost')
+
+# Patched before any module does `from config import *`.
+config.RPYC_SERVER = 'localhost'
+config.RPYC_PORT = int(os.environ.get('BENCH_RPYC_PORT', 18813))
+# RPYC_WORKERS was built from the original RPYC_PORT at import time.
+config.RPYC_WORKERS = [
+    {'host': config.RPYC_SERVER, 'port': config.RPYC_PORT, 'capacity': 1},
+]
+# The benchmarks hammer single cameras on purpose; measure the handlers,
+# not 429s.
+config.RATE_LIMITS = {}
+
+
+class BenchConfig(config.Config):
+    MONGODB_SETTINGS = {'db': 'camera_cloud_bench', 'host': MONGO_HOST}
+    ENSURE_INDEXES = not MONGO_HOST.startswith('mongomock://')
+
+
+config.config['bench'] = BenchConfig
+os.environ['config'] = 'bench'
+
+from celery_utils import client as celery_client
+
+celery_client.celery.conf.BROKER_URL = 'memory://'
+celery_client.celery.conf.CELERY_RESULT_BACKEND = None
+
+from app import app
@@ -2,17 +2,59 @@ import os, sys
 app_dir = os.path.dirname(os.path.realpath(__file__ + "/../"))
 sys.path.append(app_dir)
 
+import threading
+
 from celery_utils import client as celery_client
+import metrics
+
+_inflight = 0
+_inflight_lock = threading.Lock()
+
+
+def inflight_publishes():
+    """Number of Celery publishes currently in progress in this process."""
+    return _inflight
+
+
+def _track_inflight(delta):
+    global _inflight
+    with _inflight_lock:
+        _inflight += delta
+
 
 class CameraNotifier(object):
     def __init__(self, camera_id, streaming_url):
         self.camera_id = camera_id
         self.streaming_url = streaming_url
 
-    def notify_agent_start(self):
-        celery_client.celery.send_task(
-            'notify_agent_start',
-            (self.streaming_url, str(self.camera_id)),
-            queue=str(self.camera_id)
-        )
+    def notify_agent_start(self, producer=None):
+        # Publishing through a producer from the app's pool reuses its broker
+        # connection, and kombu only declares each queue once per connection.
+        _track_inflight(1)
+        try:
+            with celery_client.celery.producer_or_acquire(producer) as producer, \
+                    metrics.celery_publish_duration.time(task='notify_agent_start'):
+                celery_client.celery.send_task(
+                    'notify_agent_start',
+                    (self.streaming_url, str(self.camera_id)),
+                    queue=str(self.camera_id),
+                    producer=producer
+                )
+        finally:
+            _track_inflight(-1)
         return "task sent."
+
+
+def notify_agent_start_many(cameras):
+    """Send agent start messages for an iterable of (camera_id, streaming_url).
+
+    All messages are published in one pass through a single pooled producer.
+    """
+    count = 0
+    with celery_client.celery.producer_or_acquire() as producer:
+        for camera_id, streaming_url in cameras:
+            CameraNotifier(camera_id, streaming_url).notify_agent_start(
+                producer
+            )
+            count += 1
+    return count
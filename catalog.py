@@ -0,0 +1,45 @@
+import threading
+import time
+
+from config import *
+from models import models
+
+
+class Catalog(object):
+    """Name-indexed snapshot of the Algorithm and Action collections."""
+    def __init__(self, algorithms, actions):
+        self.algorithms = {a.name: frozenset(a.options) for a in algorithms}
+        self.options = frozenset(['else']).union(*self.algorithms.values())
+        self.actions = {a.name: a.params for a in actions}
+        self.required_params = {
+            name: frozenset(
+                k for k, v in params.items() if v.get('required') == 'true'
+            )
+            for name, params in self.actions.items()
+        }
+
+
+class CatalogCache(object):
+    def __init__(self, ttl=CATALOG_CACHE_TTL):
+        self.ttl = ttl
+        self._catalog = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._catalog is None or \
+                    time.time() - self._loaded_at > self.ttl:
+                self._catalog = Catalog(
+                    models.Algorithm.objects.only('name', 'options'),
+                    models.Action.objects.only('name', 'params')
+                )
+                self._loaded_at = time.time()
+            return self._catalog
+
+    def invalidate(self):
+        with self._lock:
+            self._catalog = None
+
+
+catalog_cache = CatalogCache()
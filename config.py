@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-import os, sys, datetime
+import os
 
 
 RTMP_SERVER = 'rtmp://13.57.222.238/live'
@@ -8,9 +8,161 @@ RPYC_SERVER = 'localhost'
 RPYC_PORT = '18812'
 CAMERA_API = 'http://54.177.153.23:9999/api/cameras/'
 
+# RPyC algorithm hosts that (camera, algorithm) pairs are spread over with
+# consistent hashing; capacity weighs a host's share. Actions keep running
+# on RPYC_SERVER. A host takes at most PLACEMENT_LOAD_FACTOR times its fair
+# share of the running algorithms before pairs spill to the next host.
+RPYC_WORKERS = [
+    {'host': RPYC_SERVER, 'port': RPYC_PORT, 'capacity': 1},
+]
+PLACEMENT_VNODES = 100
+PLACEMENT_LOAD_FACTOR = 1.25
+
+# Shared RPyC connection pool: max connections per server, seconds to wait
+# for a free connection, and idle seconds after which a connection is pinged
+# before reuse.
+RPYC_POOL_SIZE = 16
+RPYC_POOL_TIMEOUT = 10
+RPYC_POOL_PING_INTERVAL = 30
+RPYC_POOL_PING_TIMEOUT = 3
+
+# How a result's action list is dispatched: 'async' runs the actions
+# concurrently on a bounded thread pool, each on its own pooled RPyC
+# connection, 'serial' runs them one after another.
+ACTION_DISPATCH_MODE = 'async'
+# Max actions in flight per process and seconds to wait for each of them.
+ACTION_MAX_CONCURRENCY = 8
+ACTION_TIMEOUT = 10
+
+# Seconds an in-process snapshot of the algorithm/action catalog is reused.
+# Local writes invalidate it immediately; the TTL bounds staleness caused by
+# writes made through other processes.
+CATALOG_CACHE_TTL = 60
+# Same for the rule profiles shared by cameras.
+PROFILE_CACHE_TTL = 60
+
+# Upper bound on the `limit` query argument of the list endpoints.
+LIST_PAGE_MAX = 1000
+# Unpaginated list responses are streamed from the Mongo cursor instead of
+# being built in memory; documents are fetched and flushed in batches.
+STREAM_LIST_RESPONSES = True
+STREAM_BATCH_SIZE = 500
+
+# Max cameras accepted by one bulk request, and how many cameras share one
+# RPyC connection / Celery publish pass while a bulk request is processed.
+BULK_MAX_CAMERAS = 1000
+BULK_BATCH_SIZE = 100
+
+# Cameras whose compiled action rules are kept in memory, and distinct
+# results memoized per algorithm when resolving wildcard option keys.
+RULE_CACHE_SIZE = 10000
+RULE_MATCH_CACHE_SIZE = 256
+
+# 'inline' runs a result's status update and actions inside the result
+# request; 'queue' stores the result in a durable local queue, answers 202
+# and lets RESULT_QUEUE_WORKERS threads drain it in per-camera batches.
+RESULT_INGESTION_MODE = os.environ.get('RESULT_INGESTION_MODE', 'inline')
+RESULT_QUEUE_PATH = os.environ.get(
+    'RESULT_QUEUE_PATH', '/var/tmp/camera_cloud_results.sqlite'
+)
+RESULT_QUEUE_WORKERS = 4
+RESULT_QUEUE_BATCH_SIZE = 100
+RESULT_QUEUE_POLL_INTERVAL = 0.5
+RESULT_QUEUE_CLAIM_TIMEOUT = 300
+RESULT_QUEUE_MAX_ATTEMPTS = 5
+
+# Seconds during which a repeated (camera, algorithm, result) is dropped
+# before its actions run; 0 disables debouncing. The 'memory' backend keeps
+# up to DEBOUNCE_MAX_ENTRIES windows and the suppressed counts per process,
+# 'mongo' shares both between processes.
+DEBOUNCE_WINDOW = 0
+DEBOUNCE_BACKEND = 'memory'
+DEBOUNCE_MAX_ENTRIES = 100000
+
+# Fraction of requests profiled with cProfile; profiles of sampled requests
+# slower than PROFILE_THRESHOLD seconds are written to PROFILE_DIR.
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_THRESHOLD = 1.0
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/var/tmp/camera_cloud_profiles')
+
+# JSON library for request/response bodies: 'auto' prefers orjson, then
+# ujson, then simplejson. Request bodies quoted in error messages are cut to
+# MAX_ERROR_PAYLOAD characters.
+JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+MAX_ERROR_PAYLOAD = 256
+
+# Seconds GET responses are served from the in-process response cache, how
+# many are kept, and the largest streamed body that is cached.
+RESPONSE_CACHE_TTL = 2
+RESPONSE_CACHE_MAX_ENTRIES = 1024
+RESPONSE_CACHE_MAX_BYTES = 8 * 1024 * 1024
+
+# Camera event stream (/api/cameras/stream): events buffered per subscriber
+# before the oldest are dropped, max open streams per process, and seconds
+# between keepalive comments on an idle stream.
+EVENT_QUEUE_SIZE = 100
+EVENT_MAX_SUBSCRIBERS = 1000
+EVENT_HEARTBEAT_INTERVAL = 15
+
+# Token buckets as (tokens per second, burst) per camera and across the
+# fleet for each limited scope; None disables a bucket. The 'memory' backend
+# keeps up to RATE_LIMIT_MAX_BUCKETS buckets per process, 'mongo' shares
+# them between processes.
+RATE_LIMITS = {
+    'trigger': {'camera': (1, 5), 'global': (200, 400)},
+    'result': {'camera': (5, 20), 'global': (1000, 2000)},
+    'agent_start': {'camera': (1, 5), 'global': (200, 400)},
+}
+RATE_LIMIT_BACKEND = 'memory'
+RATE_LIMIT_MAX_BUCKETS = 100000
+
+# Admission control: requests to limited scopes get 429 while callers
+# waiting for an RPyC connection, Celery publishes in flight or queued
+# results exceed these limits (0 disables a check).
+ADMISSION_MAX_RPYC_WAITING = 64
+ADMISSION_MAX_CELERY_INFLIGHT = 256
+ADMISSION_MAX_RESULT_BACKLOG = 50000
+ADMISSION_RETRY_AFTER = 5
+
+# Algorithm results are kept in one document per camera and
+# RESULT_BUCKET_SECONDS window (aggregation intervals must be multiples of
+# it) for RESULT_RETENTION_DAYS. Set RESULT_STORE_ENABLED to False to stop
+# recording them.
+RESULT_STORE_ENABLED = True
+RESULT_BUCKET_SECONDS = 3600
+RESULT_BUCKET_MAX_SAMPLES = 1000
+RESULT_RETENTION_DAYS = 30
+RESULT_QUERY_RANGE_DEFAULT = 24 * 3600
+
+# Seconds a 'running' algorithm may go without a result or a heartbeat
+# (POST /api/cameras/<id>/heartbeat) before the reaper resets it to idle
+# and stops its instance. ALGORITHM_LEASES overrides it per algorithm.
+ALGORITHM_LEASE = 600
+ALGORITHM_LEASES = {}
+LEASE_REAP_INTERVAL = 30
+LEASE_REAP_BATCH_SIZE = 100
+
+# Built-in periodic triggering. Cameras with a trigger_interval (their own
+# or their profile's, in seconds) are triggered every interval, their start
+# times jittered over it. At most TRIGGER_MAX_INFLIGHT cameras per process
+# are being triggered at once, and none while an admission probe reports a
+# backlog.
+TRIGGER_SCHEDULER_ENABLED = True
+TRIGGER_POLL_INTERVAL = 1
+TRIGGER_MAX_INFLIGHT = 16
+TRIGGER_MIN_INTERVAL = 10
+# Cameras re-phased per bulk write when a profile's interval changes.
+TRIGGER_RESCHEDULE_BATCH = 1000
+
+# Algorithms cooldown time in seconds before an instance is reactivated.
+ALGORITHM_COOLDOWN = 15
+# Per-algorithm overrides of ALGORITHM_COOLDOWN, e.g. {'face': 30}.
+ALGORITHM_COOLDOWNS = {}
+
 class Config(object):
     DEBUG = False
     TESTING = False
+    ENSURE_INDEXES = True
 
     BASE_DIR = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
     MONGODB_SETTINGS = {'DB': 'camera_cloud',
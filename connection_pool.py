@@ -0,0 +1,157 @@
+import collections
+import contextlib
+import socket
+import threading
+import time
+
+import rpyc
+
+from config import *
+import metrics
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class RpycConnectionPool(object):
+    """Thread-safe pool of long-lived RPyC connections to one server."""
+    def __init__(self, host, port, size=RPYC_POOL_SIZE):
+        self.host = host
+        self.port = port
+        self.size = size
+        self._idle = collections.deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self.stats = {'hits': 0, 'misses': 0, 'reconnects': 0}
+        self.in_use = 0
+        self.waiting = 0
+
+    def _connect(self):
+        return rpyc.connect(self.host, self.port)
+
+    def _incr(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _is_alive(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.time() - last_used < RPYC_POOL_PING_INTERVAL:
+            return True
+        try:
+            conn.ping(timeout=RPYC_POOL_PING_TIMEOUT)
+        except Exception:
+            return False
+        return True
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        with self._lock:
+            self.waiting += 1
+        try:
+            acquired = self._slots.acquire(timeout=RPYC_POOL_TIMEOUT)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not acquired:
+            raise PoolExhausted(
+                'No RPyC connection to %s:%s available' % (self.host, self.port)
+            )
+        with self._lock:
+            self.in_use += 1
+        try:
+            with self._lock:
+                idle = self._idle.pop() if self._idle else None
+            if idle is None:
+                self._incr('misses')
+                return self._connect()
+            conn, last_used = idle
+            if self._is_alive(conn, last_used):
+                self._incr('hits')
+                return conn
+            self._close(conn)
+            self._incr('reconnects')
+            return self._connect()
+        except Exception:
+            self._release_slot()
+            raise
+
+    def _release_slot(self):
+        with self._lock:
+            self.in_use -= 1
+        self._slots.release()
+
+    def release(self, conn, discard=False):
+        if discard or conn.closed:
+            self._close(conn)
+        else:
+            with self._lock:
+                self._idle.append((conn, time.time()))
+        self._release_slot()
+
+    @contextlib.contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except (EOFError, socket.error):
+            self.release(conn, discard=True)
+            raise
+        except Exception:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), collections.deque()
+        for conn, _ in idle:
+            self._close(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(host=RPYC_SERVER, port=RPYC_PORT):
+    with _pools_lock:
+        pool = _pools.get((host, port))
+        if pool is None:
+            pool = _pools[(host, port)] = RpycConnectionPool(host, port)
+        return pool
+
+
+def get_pools():
+    with _pools_lock:
+        return list(_pools.values())
+
+
+metrics.registry.gauge(
+    'camera_cloud_rpyc_pool_events_total',
+    'RPyC pool hits, misses and reconnects.',
+    lambda: {
+        ('%s:%s' % (p.host, p.port), event): count
+        for p in get_pools() for event, count in p.stats.items()
+    },
+    labels=('server', 'event'),
+    metric_type='counter'
+)
+metrics.registry.gauge(
+    'camera_cloud_rpyc_pool_in_use',
+    'RPyC connections currently borrowed from the pool.',
+    lambda: {('%s:%s' % (p.host, p.port),): p.in_use for p in get_pools()},
+    labels=('server',)
+)
+metrics.registry.gauge(
+    'camera_cloud_rpyc_pool_waiting',
+    'Callers waiting for a free RPyC connection.',
+    lambda: {('%s:%s' % (p.host, p.port),): p.waiting for p in get_pools()},
+    labels=('server',)
+)
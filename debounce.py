@@ -0,0 +1,121 @@
+import collections
+import datetime
+import threading
+import time
+
+from pymongo.errors import DuplicateKeyError
+
+from config import *
+from models import models
+
+
+class MemoryDebounceStore(object):
+    """Per-process debounce windows, LRU-evicted beyond max_entries."""
+    def __init__(self, max_entries=DEBOUNCE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._windows = collections.OrderedDict()
+        self._suppressed = collections.Counter()
+        self._lock = threading.Lock()
+
+    def open_window(self, key, ttl):
+        """Open a window for `key`; return False if one is still active."""
+        now = time.time()
+        with self._lock:
+            expires_at = self._windows.get(key)
+            if expires_at is not None and expires_at > now:
+                self._windows.move_to_end(key)
+                return False
+            self._windows[key] = now + ttl
+            self._windows.move_to_end(key)
+            while len(self._windows) > self.max_entries:
+                self._windows.popitem(last=False)
+            return True
+
+    def add_suppressed(self, camera_id):
+        with self._lock:
+            self._suppressed[camera_id] += 1
+
+    def suppressed(self, camera_id):
+        with self._lock:
+            return self._suppressed[camera_id]
+
+    def forget(self, camera_id):
+        with self._lock:
+            self._suppressed.pop(camera_id, None)
+
+
+class MongoDebounceStore(object):
+    """Debounce windows shared by every process through MongoDB.
+
+    A window is (re)opened with an upsert guarded on the old window having
+    expired; while it is still active the upsert collides with the existing
+    key and the result is suppressed. A TTL index removes old windows.
+    Suppressed counts live in the same collection, one document per camera
+    without an expiry.
+    """
+    def open_window(self, key, ttl):
+        now = datetime.datetime.utcnow()
+        try:
+            models.DebounceWindow._get_collection().update_one(
+                {'_id': key, 'expires_at': {'$lte': now}},
+                {'$set': {
+                    'expires_at': now + datetime.timedelta(seconds=ttl)
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    def _counter(self, camera_id):
+        return 'suppressed:%s' % camera_id
+
+    def add_suppressed(self, camera_id):
+        models.DebounceWindow._get_collection().update_one(
+            {'_id': self._counter(camera_id)}, {'$inc': {'count': 1}},
+            upsert=True
+        )
+
+    def suppressed(self, camera_id):
+        counter = models.DebounceWindow._get_collection().find_one(
+            {'_id': self._counter(camera_id)}, {'count': 1}
+        )
+        return counter['count'] if counter else 0
+
+    def forget(self, camera_id):
+        models.DebounceWindow._get_collection().delete_one(
+            {'_id': self._counter(camera_id)}
+        )
+
+
+class ResultDebouncer(object):
+    """Drop results repeated for a (camera, algorithm, result) in a window."""
+    def __init__(self, store, window=DEBOUNCE_WINDOW):
+        self.store = store
+        self.window = window
+
+    def allow(self, camera_id, algorithm, result):
+        if self.window <= 0:
+            return True
+        key = '%s:%s:%s' % (camera_id, algorithm, result)
+        if self.store.open_window(key, self.window):
+            return True
+        self.store.add_suppressed(str(camera_id))
+        return False
+
+    def suppressed(self, camera_id):
+        """Results of a camera suppressed so far, across every process
+        sharing the store."""
+        return self.store.suppressed(str(camera_id))
+
+    def forget(self, camera_id):
+        self.store.forget(str(camera_id))
+
+
+def _create_store():
+    if DEBOUNCE_BACKEND == 'mongo':
+        return MongoDebounceStore()
+    return MemoryDebounceStore()
+
+
+result_debouncer = ResultDebouncer(_create_store())
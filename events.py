@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+
+from config import *
+import metrics
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscription(object):
+    """Bounded per-subscriber event queue.
+
+    When a subscriber falls behind, the oldest queued events are dropped so
+    that publishing never blocks; the number of dropped events is reported
+    with the next event the subscriber receives.
+    """
+    def __init__(self, camera_ids=None, maxsize=EVENT_QUEUE_SIZE):
+        self.camera_ids = set(camera_ids) if camera_ids else None
+        self._queue = queue.Queue(maxsize)
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def wants(self, camera_id):
+        return self.camera_ids is None or camera_id in self.camera_ids
+
+    def offer(self, event):
+        with self._lock:
+            while True:
+                try:
+                    self._queue.put_nowait(event)
+                    return
+                except queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                        self.dropped += 1
+                        metrics_dropped.inc()
+                    except queue.Empty:
+                        pass
+
+    def get(self, timeout):
+        """Return the next event, or None if none arrived within timeout."""
+        try:
+            event = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        with self._lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            event = dict(event, dropped=dropped)
+        return event
+
+
+class EventBus(object):
+    """In-process fan-out of camera status and result events."""
+    def __init__(self, max_subscribers=EVENT_MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, camera_ids=None):
+        with self._lock:
+            if len(self._subscriptions) >= self.max_subscribers:
+                raise TooManySubscribers(
+                    'Too many event stream subscribers'
+                )
+            subscription = Subscription(camera_ids)
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscriptions)
+
+    def publish(self, event_type, camera_id, **data):
+        camera_id = str(camera_id)
+        with self._lock:
+            if not self._subscriptions:
+                return
+            subscriptions = list(self._subscriptions)
+        event = dict(data, type=event_type, camera_id=camera_id,
+                     time=time.time())
+        for subscription in subscriptions:
+            if subscription.wants(camera_id):
+                subscription.offer(event)
+
+
+event_bus = EventBus()
+
+metrics_dropped = metrics.registry.counter(
+    'camera_cloud_events_dropped_total',
+    'Events dropped because a stream subscriber fell behind.'
+)
+metrics.registry.gauge(
+    'camera_cloud_event_subscribers', 'Open camera event streams.',
+    event_bus.subscriber_count
+)
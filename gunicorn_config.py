@@ -0,0 +1,19 @@
+# Production serving mode: gunicorn with gevent workers.
+#
+#   gunicorn -c gunicorn_config.py app:app
+#
+# The gevent worker monkey-patches sockets before the app is imported, so the
+# blocking MongoDB, RPyC and Celery clients used by the handlers yield to
+# other requests instead of holding an OS thread each. The app is loaded
+# after fork (no preload) so every worker opens its own MongoDB client.
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:9999')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gevent'
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 1000))
+timeout = int(os.environ.get('WORKER_TIMEOUT', 60))
+keepalive = 5
+preload_app = False
+accesslog = os.environ.get('ACCESS_LOG', '-')
@@ -0,0 +1,164 @@
+import logging
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+
+import simplejson as json
+
+from config import *
+
+
+class ResultQueue(object):
+    """Durable queue of algorithm results backed by a local SQLite file.
+
+    Results are acknowledged (deleted) only after `handler` processed them.
+    Rows claimed by a worker that died are picked up again once
+    RESULT_QUEUE_CLAIM_TIMEOUT has passed, so delivery is at-least-once.
+    Claims run in an IMMEDIATE transaction, which also makes it safe for
+    several server processes to share one queue file.
+    """
+    def __init__(self, path, handler, workers=RESULT_QUEUE_WORKERS,
+                 batch_size=RESULT_QUEUE_BATCH_SIZE):
+        self.path = path
+        self.handler = handler
+        self.workers = workers
+        self.batch_size = batch_size
+        self.stats = {'enqueued': 0, 'processed': 0, 'failed': 0,
+                      'dropped': 0}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._depth = 0
+        self._depth_checked_at = 0
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None
+            )
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'camera_id TEXT NOT NULL, '
+                'payload TEXT NOT NULL, '
+                'enqueued_at REAL NOT NULL, '
+                'claimed_at REAL, '
+                'attempts INTEGER NOT NULL DEFAULT 0)'
+            )
+            self._local.conn = conn
+        return conn
+
+    def _incr(self, key, count=1):
+        with self._lock:
+            self.stats[key] += count
+
+    def put(self, camera_id, payload):
+        self._connection().execute(
+            'INSERT INTO results (camera_id, payload, enqueued_at) '
+            'VALUES (?, ?, ?)',
+            (str(camera_id), json.dumps(payload), time.time())
+        )
+        self._incr('enqueued')
+        self.start()
+        self._wakeup.set()
+
+    def depth(self):
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM results'
+        ).fetchone()[0]
+
+    def approximate_depth(self, max_age=1.0):
+        """Queue depth, recounted at most once every `max_age` seconds."""
+        now = time.time()
+        if now - self._depth_checked_at > max_age:
+            self._depth = self.depth()
+            self._depth_checked_at = now
+        return self._depth
+
+    def start(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._work,
+                    name='result-queue-%d' % len(self._threads)
+                )
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def _claim(self):
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                'SELECT id, camera_id, payload, attempts FROM results '
+                'WHERE claimed_at IS NULL OR claimed_at < ? '
+                'ORDER BY id LIMIT ?',
+                (now - RESULT_QUEUE_CLAIM_TIMEOUT, self.batch_size)
+            ).fetchall()
+            conn.executemany(
+                'UPDATE results SET claimed_at = ?, attempts = attempts + 1 '
+                'WHERE id = ?',
+                [(now, row[0]) for row in rows]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return rows
+
+    def _ack(self, row_ids):
+        self._connection().executemany(
+            'DELETE FROM results WHERE id = ?', [(i,) for i in row_ids]
+        )
+
+    def _release(self, entries):
+        retry = [i for i, _, attempts in entries
+                 if attempts + 1 < RESULT_QUEUE_MAX_ATTEMPTS]
+        dropped = [i for i, _, attempts in entries
+                   if attempts + 1 >= RESULT_QUEUE_MAX_ATTEMPTS]
+        self._connection().executemany(
+            'UPDATE results SET claimed_at = NULL WHERE id = ?',
+            [(i,) for i in retry]
+        )
+        if dropped:
+            logging.error('Dropping %d results after %d attempts',
+                          len(dropped), RESULT_QUEUE_MAX_ATTEMPTS)
+            self._ack(dropped)
+            self._incr('dropped', len(dropped))
+
+    def _work(self):
+        while True:
+            try:
+                rows = self._claim()
+            except sqlite3.Error:
+                logging.exception('Cannot claim queued results')
+                rows = []
+            if not rows:
+                self._wakeup.wait(RESULT_QUEUE_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            by_camera = OrderedDict()
+            for row_id, camera_id, payload, attempts in rows:
+                by_camera.setdefault(camera_id, []).append(
+                    (row_id, json.loads(payload), attempts)
+                )
+            for camera_id, entries in by_camera.items():
+                try:
+                    self.handler(camera_id, [e[1] for e in entries])
+                except Exception:
+                    logging.exception(
+                        'Processing results of camera %s failed', camera_id
+                    )
+                    self._incr('failed', len(entries))
+                    self._release(entries)
+                    continue
+                self._ack([e[0] for e in entries])
+                self._incr('processed', len(entries))
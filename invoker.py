@@ -1,19 +1,47 @@
+import socket
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
 import rpyc
 import simplejson as json
 
 from config import *
+from connection_pool import get_pool
+import metrics
+
+
+def _timed_call(call, func, *args):
+    started = time.time()
+    try:
+        return func(*args)
+    except Exception:
+        metrics.rpc_errors.inc(call=call)
+        raise
+    finally:
+        metrics.rpc_duration.observe(time.time() - started, call=call)
+
 
 class Invoker(object):
-    def __init__(self, camera_id):
+    def __init__(self, camera_id, worker=None):
         self.camera_id = camera_id
-        self.conn = rpyc.connect(RPYC_SERVER, RPYC_PORT)
+        if worker is None:
+            self.pool = get_pool(RPYC_SERVER, RPYC_PORT)
+        else:
+            self.pool = get_pool(worker.host, worker.port)
         self.result_dict = {}
 
 
 class AlgorithmInvoker(Invoker):
-    def invoke_current_algorithms(self, action_dict, streaming_url):
+    def invoke_current_algorithms(self, action_dict, streaming_url,
+                                  conn=None):
+        if conn is None:
+            with self.pool.connection() as conn:
+                return self.invoke_current_algorithms(
+                    action_dict, streaming_url, conn
+                )
         for algorithm, action_item in action_dict.items():
-            func_async = rpyc.async_(self.conn.root.run_algorithm)
+            func_async = rpyc.async_(conn.root.run_algorithm)
             json_str = json.dumps(
                 {
                     'streaming_url': streaming_url,
@@ -21,21 +49,128 @@ class AlgorithmInvoker(Invoker):
                     'result_api': CAMERA_API + str(self.camera_id) + '/result'
                 }
             )
-            self.result_dict[algorithm] = func_async(
+            self.result_dict[algorithm] = _timed_call(
+                'run_algorithm',
+                func_async,
                 algorithm,
                 json_str
             )
         return self.result_dict
 
     def reactivate_algorithms(self, algorithms):
-        for algorithm in algorithms:
-            self.conn.root.stop_and_delete_instance(algorithm)
+        with self.pool.connection() as conn:
+            for algorithm in algorithms:
+                _timed_call(
+                    'stop_and_delete_instance',
+                    conn.root.stop_and_delete_instance,
+                    algorithm
+                )
         return
 
 
 class ActionInvoker(Invoker):
+    def _dump_params(self, params):
+        params = dict(params or {})
+        params['camera_id'] = str(self.camera_id)
+        return json.dumps(params)
+
     def invoke_action(self, params, action):
-        params['camera_id'] = self.camera_id
-        json_str = json.dumps(params)
-        self.result_dict[action] = self.conn.root.run_action(action, json_str)
+        json_str = self._dump_params(params)
+        with self.pool.connection() as conn:
+            self.result_dict[action] = _timed_call(
+                'run_action', conn.root.run_action, action, json_str
+            )
         return self.result_dict
+
+    def invoke_actions(self, actions):
+        """Run a list of (action, params) pairs and return their outcomes."""
+        if not actions:
+            return []
+        if ACTION_DISPATCH_MODE == 'serial':
+            return [self._invoke_serial(a, p) for a, p in actions]
+        futures = [
+            _action_executor.submit(self._invoke_bounded, action, params)
+            for action, params in actions
+        ]
+        return [future.result() for future in futures]
+
+    def _invoke_serial(self, action, params):
+        try:
+            self.invoke_action(params, action)
+        except Exception as e:
+            return {'action': action, 'status': 'error', 'error': str(e)}
+        return {'action': action, 'status': 'ok'}
+
+    def _invoke_bounded(self, action, params):
+        """Run one action on a connection of its own within ACTION_TIMEOUT.
+
+        RPyC servers answer the requests of one connection in turn, so each
+        action borrows its own connection; its timeout then starts when the
+        server can actually pick it up, not while it is queued behind a
+        slow action.
+        """
+        started = time.time()
+        try:
+            conn = self.pool.acquire()
+        except Exception as e:
+            metrics.rpc_errors.inc(call='run_action')
+            return {'action': action, 'status': 'error', 'error': str(e)}
+        discard = False
+        try:
+            async_result = rpyc.async_(conn.root.run_action)(
+                action, self._dump_params(params)
+            )
+            async_result.set_expiry(ACTION_TIMEOUT)
+            async_result.wait()
+            self.result_dict[action] = async_result.value
+        except rpyc.AsyncResultTimeout:
+            # The late reply would still arrive on this connection.
+            discard = True
+            metrics.rpc_errors.inc(call='run_action')
+            return {'action': action, 'status': 'timeout'}
+        except (EOFError, socket.error) as e:
+            discard = True
+            metrics.rpc_errors.inc(call='run_action')
+            return {'action': action, 'status': 'error', 'error': str(e)}
+        except Exception as e:
+            metrics.rpc_errors.inc(call='run_action')
+            return {'action': action, 'status': 'error', 'error': str(e)}
+        finally:
+            self.pool.release(conn, discard=discard)
+            metrics.rpc_duration.observe(
+                time.time() - started, call='run_action'
+            )
+        return {'action': action, 'status': 'ok'}
+
+
+# Shared by every result, so ACTION_MAX_CONCURRENCY bounds the actions in
+# flight per process.
+_action_executor = ThreadPoolExecutor(
+    max_workers=ACTION_MAX_CONCURRENCY, thread_name_prefix='action'
+)
+
+
+def invoke_algorithms_bulk(targets, worker=None):
+    """Start algorithms for many cameras over a single pooled connection.
+
+    `targets` is an iterable of (camera_id, action_dict, streaming_url), all
+    placed on `worker` (the default RPyC server if None). A failure ends the
+    batch, as the connection can no longer be trusted.
+
+    Returns ({camera_id: {algorithm: result}} of the algorithms sent, error)
+    where error is None or the exception that stopped the batch.
+    """
+    results = {}
+    pool = Invoker(None, worker).pool
+    try:
+        with pool.connection() as conn:
+            for camera_id, action_dict, streaming_url in targets:
+                invoker = AlgorithmInvoker(camera_id, worker)
+                # Filled as algorithms are sent, so it survives a failure.
+                results[camera_id] = invoker.result_dict
+                invoker.invoke_current_algorithms(
+                    action_dict, streaming_url, conn
+                )
+    except Exception as e:
+        return results, e
+    return results, None
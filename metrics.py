@@ -0,0 +1,197 @@
+import bisect
+import contextlib
+import threading
+import time
+
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+        for k, v in pairs
+    )
+
+
+class Counter(object):
+    type = 'counter'
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(l, '') for l in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name + _format_labels(self.labels, key), value
+
+
+class Gauge(object):
+    """Metric whose samples are read from `func` at scrape time.
+
+    `func` returns a number, or a dict mapping label value tuples to numbers.
+    Pass metric_type='counter' for totals kept by another component.
+    """
+    def __init__(self, name, description, func, labels=(),
+                 metric_type='gauge'):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.func = func
+        self.type = metric_type
+
+    def collect(self):
+        values = self.func()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in values.items():
+            yield self.name + _format_labels(self.labels, key), value
+
+
+class Histogram(object):
+    type = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(l, '') for l in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            if index < len(self.buckets):
+                counts[0][index] += 1
+            counts[1] += 1
+            counts[2] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - started, **labels)
+
+    def collect(self):
+        with self._lock:
+            values = [(k, (list(v[0]), v[1], v[2]))
+                      for k, v in self._values.items()]
+        for key, (buckets, count, total) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, buckets):
+                cumulative += bucket_count
+                yield self.name + '_bucket' + _format_labels(
+                    self.labels, key, [('le', bound)]
+                ), cumulative
+            yield self.name + '_bucket' + _format_labels(
+                self.labels, key, [('le', '+Inf')]
+            ), count
+            yield self.name + '_count' + _format_labels(self.labels, key), count
+            yield self.name + '_sum' + _format_labels(self.labels, key), total
+
+
+class Registry(object):
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append('# HELP %s %s' % (metric.name, metric.description))
+            lines.append('# TYPE %s %s' % (metric.name, metric.type))
+            for sample, value in metric.collect():
+                lines.append('%s %s' % (sample, value))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    'camera_cloud_http_requests_total', 'HTTP requests handled.',
+    labels=('endpoint', 'method', 'status')
+)
+http_request_duration = registry.histogram(
+    'camera_cloud_http_request_duration_seconds',
+    'Time spent handling HTTP requests.', labels=('endpoint', 'method')
+)
+rpc_duration = registry.histogram(
+    'camera_cloud_rpyc_call_duration_seconds',
+    'Time spent in RPyC calls to the algorithm server.', labels=('call',)
+)
+rpc_errors = registry.counter(
+    'camera_cloud_rpyc_call_errors_total', 'Failed RPyC calls.',
+    labels=('call',)
+)
+mongo_duration = registry.histogram(
+    'camera_cloud_mongo_command_duration_seconds',
+    'Time spent in MongoDB commands.', labels=('command',)
+)
+mongo_errors = registry.counter(
+    'camera_cloud_mongo_command_errors_total', 'Failed MongoDB commands.',
+    labels=('command',)
+)
+celery_publish_duration = registry.histogram(
+    'camera_cloud_celery_publish_duration_seconds',
+    'Time spent publishing Celery tasks.', labels=('task',)
+)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_duration.observe(
+            event.duration_micros / 1e6, command=event.command_name
+        )
+
+    def failed(self, event):
+        mongo_duration.observe(
+            event.duration_micros / 1e6, command=event.command_name
+        )
+        mongo_errors.inc(command=event.command_name)
+
+
+# Only applies to clients created afterwards, so this module must be
+# imported before the app connects to MongoDB.
+monitoring.register(MongoCommandListener())
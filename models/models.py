@@ -1,23 +1,143 @@
+import logging
+
 from datetime import datetime
 from flask_mongoengine import MongoEngine
+from pymongo.errors import OperationFailure
 
 db = MongoEngine()
 
 
+class AlgorithmLease(db.EmbeddedDocument):
+    algorithm = db.StringField(required=True)
+    expires_at = db.DateTimeField(required=True)
+
+
 class Camera(db.Document):
     name = db.StringField(max_length=255, required=True, unique=True)
     streaming_url = db.StringField(default='')
     action_dict = db.DictField()
     algorithm_status = db.DictField(default={})
     last_updated = db.DateTimeField()
+    status_updated = db.DateTimeField()
+    algorithm_hosts = db.DictField(default={})
+    # One lease per running algorithm; kept as a list rather than a dict
+    # keyed by algorithm so expired leases can be found with one index.
+    algorithm_leases = db.EmbeddedDocumentListField(AlgorithmLease, default=[])
+    # Shared RuleProfile; action_dict then only holds per-camera overrides.
+    profile = db.ObjectIdField()
+    # Seconds between scheduled triggers; None follows the profile.
+    trigger_interval = db.IntField()
+    next_trigger_at = db.DateTimeField()
+
+    meta = {
+        # Serves the default listing sort and the keyset pagination key;
+        # its last_updated prefix also covers plain last_updated queries.
+        # -status_updated serves the list validator (get_collection_version).
+        'indexes': [
+            ('-last_updated', '-id'), '-status_updated',
+            'algorithm_leases.expires_at', 'profile', 'next_trigger_at'
+        ]
+    }
 
     def save(self, *args, **kwargs):
         self.last_updated = datetime.now()
         if self.action_dict:
             for algorithm_name in self.action_dict.keys():
-                self.algorithm_status[algorithm_name] = 'idle'
+                if algorithm_name not in self.algorithm_status:
+                    self.algorithm_status[algorithm_name] = 'idle'
         return super(Camera, self).save(*args, **kwargs)
 
+    def set_algorithm_status(self, algorithm, status, expected=None,
+                             host=None, lease=None):
+        """Atomically set the status of one algorithm of this camera.
+
+        If `expected` is given, the update only applies while the current
+        status is one of those values (None matches a missing status).
+        `host` records the algorithm host the instance runs on and `lease`
+        the time its 'running' status expires, in the same update. 'idle'
+        drops the lease; 'cooldown' keeps it, so the reaper still stops an
+        instance whose delayed reactivation got lost. Returns True if the
+        status was changed.
+        """
+        query = {'id': self.id}
+        if expected is not None:
+            query['algorithm_status__%s__in' % algorithm] = list(expected)
+        update = {'set__algorithm_status__%s' % algorithm: status}
+        if host is not None:
+            update['set__algorithm_hosts__%s' % algorithm] = host
+        if status == 'running' and lease is not None:
+            update['__raw__'] = {'$push': {'algorithm_leases': {
+                'algorithm': algorithm, 'expires_at': lease
+            }}}
+        elif status == 'idle':
+            update['__raw__'] = {
+                '$pull': {'algorithm_leases': {'algorithm': algorithm}}
+            }
+        updated = Camera.objects(**query).update_one(
+            set__status_updated=datetime.now(),
+            **update
+        )
+        return updated == 1
+
+    def renew_algorithm_lease(self, algorithm, expires_at):
+        """Extend the lease of a running algorithm; True if it was held."""
+        updated = Camera.objects(**{
+            'id': self.id,
+            'algorithm_status__%s' % algorithm: 'running',
+            'algorithm_leases__algorithm': algorithm,
+        }).update_one(__raw__={
+            '$set': {'algorithm_leases.$.expires_at': expires_at}
+        })
+        return updated == 1
+
+    def expire_algorithm_lease(self, algorithm, now, retry_at):
+        """Put an algorithm whose lease ran out before `now` in cooldown.
+
+        The algorithm only becomes idle once its instance is stopped; the
+        lease is pushed to `retry_at` so a failed stop is retried then.
+        Returns False if the lease was renewed or released meanwhile.
+        """
+        updated = Camera.objects(
+            __raw__={'algorithm_leases': {'$elemMatch': {
+                'algorithm': algorithm, 'expires_at': {'$lt': now}
+            }}},
+            **{'id': self.id,
+               'algorithm_status__%s__in' % algorithm: ['running', 'cooldown']}
+        ).update_one(
+            set__status_updated=now,
+            __raw__={'$set': {'algorithm_leases.$.expires_at': retry_at}},
+            **{'set__algorithm_status__%s' % algorithm: 'cooldown'}
+        )
+        return updated == 1
+
+    def clear_algorithm_host(self, algorithm, host):
+        """Forget the host of an idle algorithm; True if it was cleared."""
+        updated = Camera.objects(**{
+            'id': self.id,
+            'algorithm_status__%s' % algorithm: 'idle',
+            'algorithm_hosts__%s' % algorithm: host,
+        }).update_one(**{'unset__algorithm_hosts__%s' % algorithm: True})
+        return updated == 1
+
+    @classmethod
+    def count_algorithm_hosts(cls):
+        """Return {host: number of algorithm instances placed on it}."""
+        pipeline = [
+            {'$project': {'hosts': {'$objectToArray': '$algorithm_hosts'}}},
+            {'$unwind': '$hosts'},
+            {'$group': {'_id': '$hosts.v', 'count': {'$sum': 1}}},
+        ]
+        return {
+            row['_id']: row['count'] for row in cls.objects.aggregate(pipeline)
+        }
+
+    def get_last_modified(self):
+        """Latest change to the configuration or the algorithm status."""
+        return max(
+            filter(None, [self.last_updated, self.status_updated]),
+            default=None
+        )
+
     def __unicode__(self):
         return self.name
 
@@ -26,8 +146,10 @@ class Camera(db.Document):
         camera_dict['name'] = self.name
         camera_dict['streaming_url'] = self.streaming_url
         camera_dict['action_dict'] = self.action_dict
-        camera_dict['id'] = str(self.id)
+        camera_dict['id'] = self.id
         camera_dict['algorithm_status'] = self.algorithm_status
+        camera_dict['profile'] = self.profile
+        camera_dict['trigger_interval'] = self.trigger_interval
         return camera_dict
 
 
@@ -37,6 +159,10 @@ class Algorithm(db.Document):
     options = db.ListField(default=[])
     last_updated = db.DateTimeField()
 
+    meta = {
+        'indexes': ['-last_updated']
+    }
+
     def save(self, *args, **kwargs):
         self.last_updated = datetime.now()
         return super(Algorithm, self).save(*args, **kwargs)
@@ -52,7 +178,7 @@ class Algorithm(db.Document):
         algorithm_dict['name'] = self.name
         algorithm_dict['description'] = self.description
         algorithm_dict['options'] = self.options
-        algorithm_dict['id'] = str(self.id)
+        algorithm_dict['id'] = self.id
         return algorithm_dict
 
 
@@ -62,6 +188,10 @@ class Action(db.Document):
     params = db.DictField(default={})
     last_updated = db.DateTimeField()
 
+    meta = {
+        'indexes': ['-last_updated']
+    }
+
     def save(self, *args, **kwargs):
         self.last_updated = datetime.now()
         return super(Action, self).save(*args, **kwargs)
@@ -71,5 +201,106 @@ class Action(db.Document):
         action_dict['name'] = self.name
         action_dict['description'] = self.description
         action_dict['params'] = self.params
-        action_dict['id'] = str(self.id)
+        action_dict['id'] = self.id
         return action_dict
+
+
+class RuleProfile(db.Document):
+    name = db.StringField(max_length=255, required=True, unique=True)
+    description = db.StringField(default='')
+    action_dict = db.DictField(default={})
+    trigger_interval = db.IntField()
+    last_updated = db.DateTimeField()
+
+    meta = {
+        'indexes': ['-last_updated']
+    }
+
+    def save(self, *args, **kwargs):
+        self.last_updated = datetime.now()
+        return super(RuleProfile, self).save(*args, **kwargs)
+
+    def to_dict(self):
+        profile_dict = {}
+        profile_dict['name'] = self.name
+        profile_dict['description'] = self.description
+        profile_dict['action_dict'] = self.action_dict
+        profile_dict['trigger_interval'] = self.trigger_interval
+        profile_dict['id'] = self.id
+        return profile_dict
+
+
+class DebounceWindow(db.Document):
+    key = db.StringField(primary_key=True)
+    expires_at = db.DateTimeField()
+    # Only set on the per-camera suppressed counters, which never expire.
+    count = db.IntField()
+
+    meta = {
+        'indexes': [{'fields': ['expires_at'], 'expireAfterSeconds': 0}]
+    }
+
+
+class RateLimitBucket(db.Document):
+    key = db.StringField(primary_key=True)
+    tokens = db.FloatField()
+    ts = db.FloatField()
+    expires_at = db.DateTimeField()
+
+    meta = {
+        'indexes': [{'fields': ['expires_at'], 'expireAfterSeconds': 0}]
+    }
+
+
+class ResultBucket(db.Document):
+    """Algorithm results of one camera reported within one time window.
+
+    A window holds at most RESULT_BUCKET_MAX_SAMPLES results; a full window
+    continues in another document with the same camera and start.
+    """
+    camera = db.ObjectIdField(required=True)
+    start = db.DateTimeField(required=True)
+    n = db.IntField(default=0)
+    # Results per algorithm, kept alongside the samples for aggregation.
+    counts = db.DictField(default={})
+    samples = db.ListField(db.DictField(), default=[])
+    expires_at = db.DateTimeField()
+
+    meta = {
+        'indexes': [
+            ('camera', 'start'),
+            'start',
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0},
+        ]
+    }
+
+
+def get_collection_version(document, fields=('last_updated',)):
+    """Return (document count, latest value of `fields`) of a collection.
+
+    Each field is read from its descending index and the count from the
+    collection metadata, so this is cheap enough to run on every request.
+    """
+    latest = [
+        document.objects.order_by('-' + field).scalar(field).first()
+        for field in fields
+    ]
+    return (
+        document._get_collection().estimated_document_count(),
+        max(filter(None, latest), default=None)
+    )
+
+
+def ensure_indexes():
+    """Create the indexes declared by the models and the status index."""
+    for document in (Camera, Algorithm, Action, RuleProfile,
+                     DebounceWindow, RateLimitBucket, ResultBucket):
+        document.ensure_indexes()
+    # algorithm_status is keyed by algorithm name, so its keys can only be
+    # covered by a wildcard index (MongoDB 4.2+).
+    try:
+        Camera._get_collection().create_index(
+            [('algorithm_status.$**', 1)], name='algorithm_status_wildcard'
+        )
+    except OperationFailure as e:
+        logging.warning('Cannot create algorithm_status index: %s', e)
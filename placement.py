@@ -0,0 +1,151 @@
+import bisect
+import hashlib
+import logging
+import math
+import threading
+
+from config import *
+import metrics
+
+
+def _hash(value):
+    return int(hashlib.md5(value.encode('utf-8')).hexdigest()[:16], 16)
+
+
+class Worker(object):
+    def __init__(self, host, port, capacity=1):
+        self.host = host
+        self.port = port
+        self.capacity = capacity
+        self.key = '%s:%s' % (host, port)
+
+    def to_dict(self):
+        return {'host': self.host, 'port': self.port,
+                'capacity': self.capacity}
+
+
+class WorkerRegistry(object):
+    """Places (camera, algorithm) pairs on RPyC algorithm hosts.
+
+    Hosts sit on a consistent-hash ring with virtual nodes in proportion to
+    their capacity, so adding or removing a host only moves the pairs that
+    hashed next to it. Placement walks the ring clockwise from the pair's
+    hash and skips hosts whose load already exceeds load_factor times their
+    fair share of the current total ("consistent hashing with bounded
+    loads"). Loads count the placements currently recorded on cameras.
+    """
+    def __init__(self, workers=(), vnodes=PLACEMENT_VNODES,
+                 load_factor=PLACEMENT_LOAD_FACTOR, load_source=None):
+        self.vnodes = vnodes
+        self.load_factor = load_factor
+        self.load_source = load_source
+        self._workers = {}
+        self._ring = []
+        self._loads = {}
+        self._loads_synced = load_source is None
+        self._lock = threading.Lock()
+        for worker in workers:
+            self._workers[worker.key] = worker
+        self._rebuild()
+
+    def _rebuild(self):
+        ring = []
+        for worker in self._workers.values():
+            for i in range(max(1, int(self.vnodes * worker.capacity))):
+                ring.append((_hash('%s#%d' % (worker.key, i)), worker.key))
+        ring.sort()
+        self._ring = ring
+
+    def add_worker(self, worker):
+        with self._lock:
+            self._workers[worker.key] = worker
+            self._rebuild()
+
+    def remove_worker(self, key):
+        with self._lock:
+            self._workers.pop(key, None)
+            self._loads.pop(key, None)
+            self._rebuild()
+
+    def get(self, key):
+        return self._workers.get(key)
+
+    def workers(self):
+        with self._lock:
+            return [dict(w.to_dict(), load=self._loads.get(w.key, 0))
+                    for w in self._workers.values()]
+
+    def _sync_loads(self):
+        try:
+            self._loads = dict(self.load_source())
+        except Exception:
+            logging.exception('Cannot load algorithm placements')
+        self._loads_synced = True
+
+    def _has_room(self, key, total_load, total_capacity):
+        share = self._workers[key].capacity / float(total_capacity)
+        limit = math.ceil(self.load_factor * (total_load + 1) * share)
+        return self._loads.get(key, 0) < limit
+
+    def place(self, camera_id, algorithm, current=None):
+        """Return (worker key, is_new) for a pair.
+
+        A pair already placed on a live host (`current`) stays there.
+        New placements are counted until released.
+        """
+        with self._lock:
+            if not self._loads_synced:
+                self._sync_loads()
+            if current in self._workers:
+                return current, False
+            if not self._ring:
+                return None, False
+            total_load = sum(self._loads.get(k, 0) for k in self._workers)
+            total_capacity = sum(w.capacity for w in self._workers.values())
+            start = bisect.bisect(
+                self._ring, (_hash('%s/%s' % (camera_id, algorithm)),)
+            )
+            chosen = None
+            seen = set()
+            for i in range(len(self._ring)):
+                key = self._ring[(start + i) % len(self._ring)][1]
+                if key in seen:
+                    continue
+                seen.add(key)
+                if chosen is None:
+                    chosen = key
+                if self._has_room(key, total_load, total_capacity):
+                    chosen = key
+                    break
+                if len(seen) == len(self._workers):
+                    break
+            self._loads[chosen] = self._loads.get(chosen, 0) + 1
+            return chosen, True
+
+    def release(self, key):
+        with self._lock:
+            if self._loads.get(key, 0) > 0:
+                self._loads[key] -= 1
+
+
+def _configured_workers():
+    return [Worker(w['host'], w['port'], w.get('capacity', 1))
+            for w in RPYC_WORKERS]
+
+
+def _placement_counts():
+    from models import models
+    return models.Camera.count_algorithm_hosts()
+
+
+worker_registry = WorkerRegistry(
+    _configured_workers(), load_source=_placement_counts
+)
+
+metrics.registry.gauge(
+    'camera_cloud_worker_placements',
+    'Algorithm instances placed on each RPyC algorithm host.',
+    lambda: {('%s:%s' % (w['host'], w['port']),): w['load']
+             for w in worker_registry.workers()},
+    labels=('worker',)
+)
@@ -0,0 +1,80 @@
+import threading
+import time
+
+from config import *
+from models import models
+
+
+class Profile(object):
+    def __init__(self, action_dict, last_updated, trigger_interval=None):
+        self.action_dict = action_dict
+        self.last_updated = last_updated
+        self.trigger_interval = trigger_interval
+
+
+class ProfileCache(object):
+    """In-process cache of the rule profiles shared by cameras.
+
+    A camera with a profile runs the profile's rules, with its own
+    action_dict overriding them per algorithm. Editing a profile therefore
+    changes every camera using it without touching the cameras; the
+    profile's last_updated is part of the rule table version, so compiled
+    rules follow the edit once this cache reloads the profile.
+    """
+    def __init__(self, ttl=PROFILE_CACHE_TTL):
+        self.ttl = ttl
+        self._profiles = {}
+        self._lock = threading.Lock()
+
+    def get(self, profile_id):
+        """Return the Profile, or None if it does not exist."""
+        key = str(profile_id)
+        with self._lock:
+            entry = self._profiles.get(key)
+            if entry is not None and time.time() - entry[1] <= self.ttl:
+                return entry[0]
+        try:
+            document = models.RuleProfile.objects.only(
+                'action_dict', 'last_updated', 'trigger_interval'
+            ).get(id=profile_id)
+            profile = Profile(
+                document.action_dict, document.last_updated,
+                document.trigger_interval
+            )
+        except models.RuleProfile.DoesNotExist:
+            profile = None
+        with self._lock:
+            self._profiles[key] = (profile, time.time())
+        return profile
+
+    def invalidate(self, profile_id):
+        with self._lock:
+            self._profiles.pop(str(profile_id), None)
+
+    def resolve(self, camera, overrides=None):
+        """Return the action_dict a camera effectively runs."""
+        if overrides is None:
+            overrides = camera.action_dict
+        profile = self.get(camera.profile) if camera.profile else None
+        if profile is None:
+            return overrides
+        action_dict = dict(profile.action_dict)
+        action_dict.update(overrides)
+        return action_dict
+
+    def trigger_interval(self, camera):
+        """Seconds between scheduled triggers of a camera, or None."""
+        if camera.trigger_interval or not camera.profile:
+            return camera.trigger_interval
+        profile = self.get(camera.profile)
+        return profile and profile.trigger_interval
+
+    def version(self, camera):
+        """Version of a camera's effective rules, for the rule cache."""
+        if not camera.profile:
+            return camera.last_updated
+        profile = self.get(camera.profile)
+        return (camera.last_updated, profile and profile.last_updated)
+
+
+profile_cache = ProfileCache()
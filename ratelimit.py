@@ -0,0 +1,168 @@
+import collections
+import datetime
+import functools
+import math
+import threading
+import time
+
+from pymongo import ReturnDocument
+
+from config import *
+from models import models
+import metrics
+import utils
+
+rejected_requests = metrics.registry.counter(
+    'camera_cloud_rejected_requests_total',
+    'Requests answered with 429 by rate limiting or admission control.',
+    labels=('scope', 'reason')
+)
+
+
+class MemoryBucketStore(object):
+    """Per-process token buckets, LRU-evicted beyond max_entries."""
+    def __init__(self, max_entries=RATE_LIMIT_MAX_BUCKETS):
+        self.max_entries = max_entries
+        self._buckets = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """Take a token; return 0 if granted, else seconds until one is."""
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0
+            else:
+                retry_after = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+
+class MongoBucketStore(object):
+    """Token buckets shared by every process through MongoDB.
+
+    Refill and take happen in one pipeline update (MongoDB 4.2+), so
+    concurrent requests cannot both spend the last token.
+    """
+    def take(self, key, rate, burst):
+        now = time.time()
+        bucket = models.RateLimitBucket._get_collection().find_one_and_update(
+            {'_id': key},
+            [
+                {'$set': {
+                    'tokens': {'$min': [burst, {'$add': [
+                        {'$ifNull': ['$tokens', burst]},
+                        {'$multiply': [
+                            {'$subtract': [now, {'$ifNull': ['$ts', now]}]},
+                            rate
+                        ]}
+                    ]}]},
+                    'ts': now,
+                }},
+                {'$set': {'granted': {'$gte': ['$tokens', 1]}}},
+                {'$set': {
+                    'tokens': {'$cond': [
+                        '$granted', {'$subtract': ['$tokens', 1]}, '$tokens'
+                    ]},
+                    'expires_at': datetime.datetime.utcnow()
+                        + datetime.timedelta(seconds=burst / rate + 60),
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if bucket['granted']:
+            return 0
+        return (1 - bucket['tokens']) / rate
+
+
+class RateLimiter(object):
+    """Per-camera and global token buckets for each limited scope."""
+    def __init__(self, store, limits=RATE_LIMITS):
+        self.store = store
+        self.limits = limits
+
+    def check(self, scope, camera_id=None):
+        """Return None if the request may proceed, else seconds to wait."""
+        limits = self.limits.get(scope, {})
+        buckets = []
+        if camera_id is not None and limits.get('camera'):
+            buckets.append(('camera:%s:%s' % (scope, camera_id),
+                            limits['camera']))
+        if limits.get('global'):
+            buckets.append(('global:%s' % scope, limits['global']))
+        for key, (rate, burst) in buckets:
+            retry_after = self.store.take(key, rate, burst)
+            if retry_after:
+                return retry_after
+        return None
+
+
+class AdmissionController(object):
+    """Reject work while a downstream backlog is above its limit.
+
+    Probes are (name, func, limit) where func returns the current backlog.
+    """
+    def __init__(self):
+        self.probes = []
+
+    def add_probe(self, name, func, limit):
+        self.probes.append((name, func, limit))
+
+    def check(self):
+        """Return the name of the first overloaded backlog, if any."""
+        for name, func, limit in self.probes:
+            if limit and func() > limit:
+                return name
+        return None
+
+
+def _create_store():
+    if RATE_LIMIT_BACKEND == 'mongo':
+        return MongoBucketStore()
+    return MemoryBucketStore()
+
+
+rate_limiter = RateLimiter(_create_store())
+admission = AdmissionController()
+
+
+def too_many_requests(scope, reason, retry_after, message):
+    rejected_requests.inc(scope=scope, reason=reason)
+    resp = utils.make_json_response(429, message)
+    resp.headers['Retry-After'] = str(max(1, int(math.ceil(retry_after))))
+    return resp
+
+
+def rate_limited(scope, per_request=True):
+    """Apply the scope's rate limits and admission control to a view.
+
+    The per-camera bucket is keyed on the view's camera_id argument. Views
+    acting on many cameras pass per_request=False and charge every camera
+    through rate_limiter.check themselves.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            retry_after = rate_limiter.check(
+                scope, kwargs.get('camera_id')
+            ) if per_request else None
+            if retry_after is not None:
+                return too_many_requests(
+                    scope, 'rate_limit', retry_after, 'Rate limit exceeded'
+                )
+            overloaded = admission.check()
+            if overloaded is not None:
+                return too_many_requests(
+                    scope, overloaded, ADMISSION_RETRY_AFTER,
+                    'Server overloaded: %s backlog too high' % overloaded
+                )
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
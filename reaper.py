@@ -0,0 +1,86 @@
+import logging
+import threading
+import time
+
+from datetime import datetime, timedelta
+
+from config import *
+import metrics
+from models import models
+
+
+def get_lease_expiry(algorithm, now=None):
+    """Time at which a lease on `algorithm` taken or renewed now expires."""
+    lease = ALGORITHM_LEASES.get(algorithm, ALGORITHM_LEASE)
+    return (now or datetime.now()) + timedelta(seconds=lease)
+
+
+class LeaseReaper(object):
+    """Stop and reset algorithms whose lease expired.
+
+    An algorithm whose instance crashed or whose result was lost would
+    otherwise stay 'running' and be skipped by every later trigger.
+    Expired leases are found with one query on the lease expiry index; each
+    one is moved to 'cooldown' conditionally on the lease still being
+    expired, so a heartbeat racing with the reaper, or several reaping
+    processes, are safe. `on_reaped(camera, algorithm)` runs for every
+    algorithm actually reaped and is expected to stop its instance and make
+    it idle; until it does, the lease comes up again one lease later.
+    """
+    def __init__(self, on_reaped, interval=LEASE_REAP_INTERVAL,
+                 batch_size=LEASE_REAP_BATCH_SIZE):
+        self.on_reaped = on_reaped
+        self.interval = interval
+        self.batch_size = batch_size
+        self._thread = None
+
+    def reap(self):
+        now = datetime.now()
+        cameras = models.Camera.objects(
+            algorithm_leases__expires_at__lt=now
+        ).only('algorithm_leases').limit(self.batch_size)
+        reaped = 0
+        for camera in cameras:
+            for lease in camera.algorithm_leases:
+                if lease.expires_at >= now:
+                    continue
+                if not camera.expire_algorithm_lease(
+                    lease.algorithm, now,
+                    get_lease_expiry(lease.algorithm, now)
+                ):
+                    continue
+                reaped += 1
+                reaped_leases.inc(algorithm=lease.algorithm)
+                try:
+                    self.on_reaped(camera, lease.algorithm)
+                except Exception:
+                    logging.exception(
+                        'Cannot stop reaped algorithm %s of camera %s',
+                        lease.algorithm, camera.id
+                    )
+        return reaped
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name='lease-reaper'
+            )
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                # A full batch means more may be waiting; go again at once.
+                if self.reap() >= self.batch_size:
+                    continue
+            except Exception:
+                logging.exception('Lease reaper pass failed')
+            time.sleep(self.interval)
+
+
+reaped_leases = metrics.registry.counter(
+    'camera_cloud_leases_reaped_total',
+    'Algorithms stopped and reset after their lease expired.',
+    labels=('algorithm',)
+)
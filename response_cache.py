@@ -0,0 +1,171 @@
+import functools
+import hashlib
+import threading
+import time
+
+from collections import OrderedDict
+
+from flask import request, make_response
+
+from config import *
+
+
+class CachedResponse(object):
+    __slots__ = ('body', 'headers', 'etag', 'last_modified', 'expires_at')
+
+    def __init__(self, body, headers, last_modified, ttl, etag=None):
+        self.body = body
+        self.headers = headers
+        self.etag = etag or hashlib.sha1(body).hexdigest()
+        self.last_modified = last_modified
+        self.expires_at = time.time() + ttl
+
+    def to_response(self):
+        resp = make_response(self.body, 200)
+        for key, value in self.headers:
+            resp.headers[key] = value
+        _set_validators(resp, self.etag, self.last_modified)
+        return resp.make_conditional(request)
+
+
+def _set_validators(resp, etag, last_modified):
+    if etag is not None:
+        resp.set_etag(etag)
+    if last_modified is not None:
+        resp.last_modified = last_modified
+    resp.headers['Cache-Control'] = 'no-cache'
+
+
+class ResponseCache(object):
+    """Short-lived per-process cache of GET responses, grouped by namespace.
+
+    Writes invalidate a whole namespace. A response is only stored if its
+    namespace was not invalidated while it was being built, so a slow read
+    racing a write cannot put stale data back into the cache.
+    """
+    def __init__(self, ttl=RESPONSE_CACHE_TTL,
+                 max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, namespace):
+        with self._lock:
+            return self._generations.get(namespace, 0)
+
+    def get(self, namespace, key):
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return None
+            if entry.expires_at < time.time():
+                del self._entries[(namespace, key)]
+                return None
+            return entry
+
+    def set(self, namespace, key, generation, entry):
+        with self._lock:
+            if self._generations.get(namespace, 0) != generation:
+                return
+            self._entries[(namespace, key)] = entry
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, namespace):
+        with self._lock:
+            self._generations[namespace] = \
+                self._generations.get(namespace, 0) + 1
+            for key in [k for k in self._entries if k[0] == namespace]:
+                del self._entries[key]
+
+
+response_cache = ResponseCache()
+
+_UNCACHED_HEADERS = ('content-length', 'etag', 'last-modified',
+                     'cache-control')
+
+
+class _CachingIterator(object):
+    """Pass a streamed body through, keeping a copy if it is small enough."""
+    def __init__(self, iterable, on_complete):
+        self.iterable = iterable
+        self.on_complete = on_complete
+
+    def __iter__(self):
+        chunks = []
+        size = 0
+        for chunk in self.iterable:
+            if chunks is not None:
+                size += len(chunk)
+                if size > RESPONSE_CACHE_MAX_BYTES:
+                    chunks = None
+                else:
+                    chunks.append(chunk)
+            yield chunk
+        if chunks is not None:
+            self.on_complete(b''.join(chunks))
+
+    def close(self):
+        if hasattr(self.iterable, 'close'):
+            self.iterable.close()
+
+
+def cached_response(namespace, validator=None):
+    """Serve a GET view from the response cache with ETag revalidation.
+
+    Successful responses are cached for RESPONSE_CACHE_TTL seconds under the
+    request path and query string. Cached and freshly built responses carry
+    an ETag (and Last-Modified when the view set one), and conditional
+    requests that still match are answered with 304 Not Modified. A streamed
+    response is passed through as is and cached once fully sent.
+
+    `validator()` returns the (etag, last_modified) of the current data.
+    When given, it is checked before the cache and the view, so a matching
+    conditional request gets its 304 without building the body, and cache
+    entries built for other data are not served.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = last_modified = None
+            if validator is not None:
+                etag, last_modified = validator()
+                resp = make_response(b'', 200)
+                _set_validators(resp, etag, last_modified)
+                resp = resp.make_conditional(request)
+                if resp.status_code == 304:
+                    return resp
+            key = request.full_path
+            entry = response_cache.get(namespace, key)
+            if entry is not None and etag in (None, entry.etag):
+                return entry.to_response()
+            generation = response_cache.generation(namespace)
+            resp = view(*args, **kwargs)
+            if resp.status_code != 200:
+                return resp
+            headers = [(k, v) for k, v in resp.headers.items()
+                       if k.lower() not in _UNCACHED_HEADERS]
+            last_modified = resp.last_modified or last_modified
+            if resp.is_streamed:
+                resp.response = _CachingIterator(
+                    resp.response,
+                    lambda body: response_cache.set(
+                        namespace, key, generation, CachedResponse(
+                            body, headers, last_modified,
+                            response_cache.ttl, etag
+                        )
+                    )
+                )
+                _set_validators(resp, etag, last_modified)
+                return resp
+            entry = CachedResponse(
+                resp.get_data(), headers, last_modified, response_cache.ttl,
+                etag
+            )
+            response_cache.set(namespace, key, generation, entry)
+            return entry.to_response()
+        return wrapper
+    return decorator
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+
+from config import *
+from models import models
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class ResultStore(object):
+    """Time-bucketed history of algorithm results.
+
+    Results of a camera are appended to the document of their time window
+    with a single upsert ($push of the samples, $inc of the per-algorithm
+    counts), so recording costs one write per result POST however many
+    algorithms it reports. Count aggregations read the counts only; range
+    queries unwind the samples of the matching windows.
+    """
+    def __init__(self, bucket_seconds=RESULT_BUCKET_SECONDS,
+                 max_samples=RESULT_BUCKET_MAX_SAMPLES,
+                 retention_days=RESULT_RETENTION_DAYS):
+        self.bucket_seconds = bucket_seconds
+        self.max_samples = max_samples
+        self.retention = timedelta(days=retention_days)
+
+    def bucket_start(self, ts):
+        offset = (ts - EPOCH).total_seconds() % self.bucket_seconds
+        return ts - timedelta(seconds=offset)
+
+    def record(self, camera_id, results, suppressed=(), now=None):
+        """Store the {algorithm: result} reported by a camera at `now`."""
+        if not results:
+            return
+        now = now or datetime.now()
+        start = self.bucket_start(now)
+        samples = [
+            {'t': now, 'algorithm': algorithm, 'result': result,
+             'suppressed': algorithm in suppressed}
+            for algorithm, result in results.items()
+        ]
+        inc = {'n': len(samples)}
+        for algorithm in results:
+            inc['counts.%s' % algorithm] = 1
+        models.ResultBucket.objects(
+            camera=camera_id, start=start, n__lte=self.max_samples - len(samples)
+        ).update_one(upsert=True, __raw__={
+            '$push': {'samples': {'$each': samples}},
+            '$inc': inc,
+            '$setOnInsert': {
+                'expires_at': start + timedelta(
+                    seconds=self.bucket_seconds
+                ) + self.retention
+            },
+        })
+
+    def delete(self, camera_id):
+        models.ResultBucket.objects(camera=camera_id).delete()
+
+    def _match(self, start, end, camera_id=None):
+        match = {'start': {'$gte': self.bucket_start(start), '$lt': end}}
+        if camera_id is not None:
+            match['camera'] = camera_id
+        return match
+
+    def query(self, camera_id, start, end, algorithm=None, limit=None):
+        """Return the results of a camera reported in [start, end)."""
+        sample_match = {'samples.t': {'$gte': start, '$lt': end}}
+        if algorithm is not None:
+            sample_match['samples.algorithm'] = algorithm
+        pipeline = [
+            {'$match': self._match(start, end, camera_id)},
+            {'$unwind': '$samples'},
+            {'$match': sample_match},
+            {'$sort': {'samples.t': 1}},
+        ]
+        if limit:
+            pipeline.append({'$limit': limit})
+        pipeline.append({'$replaceRoot': {'newRoot': '$samples'}})
+        return list(models.ResultBucket.objects.aggregate(pipeline))
+
+    def aggregate(self, start, end, interval, camera_id=None,
+                  algorithm=None, by_camera=True):
+        """Count results per interval and algorithm (and camera).
+
+        `interval` is in seconds and must be a multiple of the bucket size,
+        since the counts are kept per bucket; `start` is rounded down to a
+        bucket boundary.
+        """
+        if interval <= 0 or interval % self.bucket_seconds:
+            raise ValueError(
+                'interval must be a multiple of %d seconds'
+                % self.bucket_seconds
+            )
+        slot = {'$subtract': ['$start', {'$mod': [
+            {'$subtract': ['$start', EPOCH]}, interval * 1000
+        ]}]}
+        key = {'slot': '$slot', 'algorithm': '$counts.k'}
+        if by_camera:
+            key['camera'] = '$camera'
+        pipeline = [
+            {'$match': self._match(start, end, camera_id)},
+            {'$project': {
+                'camera': 1, 'slot': slot,
+                'counts': {'$objectToArray': '$counts'},
+            }},
+            {'$unwind': '$counts'},
+        ]
+        if algorithm is not None:
+            pipeline.append({'$match': {'counts.k': algorithm}})
+        pipeline += [
+            {'$group': {'_id': key, 'count': {'$sum': '$counts.v'}}},
+            {'$sort': {'_id.slot': 1, '_id.algorithm': 1}},
+        ]
+        return [
+            dict(row['_id'], count=row['count'])
+            for row in models.ResultBucket.objects.aggregate(pipeline)
+        ]
+
+
+result_store = ResultStore()
@@ -0,0 +1,134 @@
+import fnmatch
+import sys
+import threading
+
+from collections import OrderedDict
+
+from config import *
+
+OPTION_SEPARATOR = '|'
+WILDCARD_CHARS = frozenset('*?[')
+
+
+def split_option_key(key):
+    """Split an action_dict option key such as 'car|truck' into options."""
+    return [option.strip() for option in key.split(OPTION_SEPARATOR)]
+
+
+def is_pattern(option):
+    return not WILDCARD_CHARS.isdisjoint(option)
+
+
+def option_key_is_valid(key, known_options):
+    """Check every option of a key is known, or a pattern matching one."""
+    for option in split_option_key(key):
+        if is_pattern(option):
+            if not fnmatch.filter(known_options, option):
+                return False
+        elif option not in known_options:
+            return False
+    return True
+
+
+class AlgorithmRules(object):
+    """Compiled option -> actions table of one algorithm.
+
+    Exact options (including each member of 'a|b' keys) are resolved with a
+    single dict lookup. Wildcard keys are only tried on a miss, and the
+    outcome is memoized per result so each distinct result pays for pattern
+    matching once.
+    """
+    __slots__ = ('exact', 'patterns', 'default', '_resolved')
+
+    def __init__(self, option_rules, camera_id):
+        self.exact = {}
+        self.patterns = []
+        self.default = ()
+        self._resolved = {}
+        for key, actions in option_rules.items():
+            compiled = tuple(
+                (sys.intern(a['action']),
+                 dict(a.get('params') or {}, camera_id=str(camera_id)))
+                for a in actions if a
+            )
+            if key == 'else':
+                self.default = compiled
+                continue
+            for option in split_option_key(key):
+                if is_pattern(option):
+                    self.patterns.append((option, compiled))
+                else:
+                    self.exact[sys.intern(option)] = compiled
+
+    def match(self, result):
+        try:
+            return self.exact[result]
+        except KeyError:
+            pass
+        try:
+            return self._resolved[result]
+        except KeyError:
+            pass
+        for pattern, actions in self.patterns:
+            if fnmatch.fnmatchcase(result, pattern):
+                break
+        else:
+            actions = self.default
+        if len(self._resolved) < RULE_MATCH_CACHE_SIZE:
+            self._resolved[result] = actions
+        return actions
+
+
+class RuleTable(object):
+    """Dispatch table compiled from one version of a camera's action_dict."""
+    def __init__(self, camera_id, version, action_dict):
+        self.camera_id = camera_id
+        self.version = version
+        self.algorithms = {
+            sys.intern(algorithm): AlgorithmRules(option_rules, camera_id)
+            for algorithm, option_rules in action_dict.items()
+        }
+
+    def match(self, algorithm, result):
+        """Return the (action, params) pairs to run for a result."""
+        rules = self.algorithms.get(algorithm)
+        if rules is None:
+            return ()
+        if not isinstance(result, str):
+            result = str(result)
+        return rules.match(result)
+
+
+class RuleCache(object):
+    """LRU cache of compiled RuleTables keyed by camera id."""
+    def __init__(self, size=RULE_CACHE_SIZE):
+        self.size = size
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, camera_id, version, load_action_dict):
+        """Return the camera's table, compiling it if `version` changed.
+
+        `load_action_dict` is only called on a miss, so callers can avoid
+        loading action_dict from the database when the table is current.
+        """
+        key = str(camera_id)
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None and table.version == version:
+                self._tables.move_to_end(key)
+                return table
+        table = RuleTable(camera_id, version, load_action_dict())
+        with self._lock:
+            self._tables[key] = table
+            self._tables.move_to_end(key)
+            while len(self._tables) > self.size:
+                self._tables.popitem(last=False)
+        return table
+
+    def invalidate(self, camera_id):
+        with self._lock:
+            self._tables.pop(str(camera_id), None)
+
+
+rule_cache = RuleCache()
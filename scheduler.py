@@ -0,0 +1,66 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from config import *
+import metrics
+
+
+class CooldownScheduler(object):
+    """Run callbacks after a delay on a single background thread."""
+    def __init__(self):
+        self._queue = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def get_cooldown(self, algorithm):
+        return ALGORITHM_COOLDOWNS.get(algorithm, ALGORITHM_COOLDOWN)
+
+    def schedule(self, delay, func, *args):
+        with self._cond:
+            heapq.heappush(
+                self._queue,
+                (time.time() + delay, next(self._counter), func, args)
+            )
+            self._ensure_started()
+            self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return len(self._queue)
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name='cooldown-scheduler'
+            )
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                due, _, func, args = self._queue[0]
+                now = time.time()
+                if due > now:
+                    self._cond.wait(due - now)
+                    continue
+                heapq.heappop(self._queue)
+            try:
+                func(*args)
+            except Exception:
+                logging.exception('Scheduled call %r failed', func)
+
+
+cooldown_scheduler = CooldownScheduler()
+
+metrics.registry.gauge(
+    'camera_cloud_cooldown_pending',
+    'Algorithm reactivations waiting for their cooldown.',
+    cooldown_scheduler.pending
+)
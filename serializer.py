@@ -0,0 +1,58 @@
+"""JSON encoding of request and response bodies.
+
+Picks orjson, then ujson when installed, and falls back to simplejson;
+JSON_BACKEND forces one of them. Every backend encodes ObjectId and datetime
+values, so documents can be serialized without converting them first.
+dumps() always returns UTF-8 encoded bytes.
+"""
+import datetime
+
+import simplejson
+from bson import ObjectId
+
+from config import JSON_BACKEND
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+    # `default` is only supported by ujson >= 5.4.
+    ujson.dumps(None, default=str)
+except (ImportError, TypeError):
+    ujson = None
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    raise TypeError('%r is not JSON serializable' % obj)
+
+
+def _orjson_dumps(data):
+    return orjson.dumps(
+        data, default=_default, option=orjson.OPT_NON_STR_KEYS
+    )
+
+
+def _ujson_dumps(data):
+    return ujson.dumps(data, default=_default).encode('utf-8')
+
+
+def _simplejson_dumps(data):
+    return simplejson.dumps(data, default=_default).encode('utf-8')
+
+
+def _select_backend(name):
+    if name in ('auto', 'orjson') and orjson is not None:
+        return 'orjson', _orjson_dumps, orjson.loads
+    if name in ('auto', 'ujson') and ujson is not None:
+        return 'ujson', _ujson_dumps, ujson.loads
+    return 'simplejson', _simplejson_dumps, simplejson.loads
+
+
+BACKEND, dumps, loads = _select_backend(JSON_BACKEND)
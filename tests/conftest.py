@@ -0,0 +1,71 @@
+"""Fixtures running the app against mongomock and a fake RPyC server.
+
+The app is the one of benchmarks.stub_app; set BENCH_MONGO_HOST to run the
+tests against a real mongod instead (required by the index tests).
+"""
+import os
+
+import pytest
+
+from benchmarks.run import start_fake_rpyc
+
+# Before stub_app patches config from it.
+os.environ['BENCH_RPYC_PORT'] = str(start_fake_rpyc(0.0))
+
+from benchmarks.stub_app import app, MONGO_HOST
+from catalog import catalog_cache
+from models import models
+from response_cache import response_cache
+
+ALGORITHM = 'test_algo'
+ACTION = 'test_notify'
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    for document in (models.Camera, models.Algorithm, models.Action,
+                     models.RuleProfile, models.ResultBucket):
+        document.drop_collection()
+    if not MONGO_HOST.startswith('mongomock://'):
+        models.ensure_indexes()
+    catalog_cache.invalidate()
+    for namespace in ('cameras', 'algorithms', 'actions', 'profiles'):
+        response_cache.invalidate(namespace)
+    yield
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+@pytest.fixture
+def make_camera():
+    """Create a camera running ALGORITHM-style algorithms, idle by default."""
+    def make(name='cam', algorithms=(ALGORITHM,), status='idle'):
+        for algorithm in algorithms:
+            if not models.Algorithm.objects(name=algorithm):
+                models.Algorithm(
+                    name=algorithm, options=['person', 'car']
+                ).save()
+        if not models.Action.objects(name=ACTION):
+            models.Action(name=ACTION, params={}).save()
+        camera = models.Camera(
+            name=name,
+            streaming_url='rtmp://test/' + name,
+            action_dict={
+                algorithm: {'person': [{'action': ACTION, 'params': {}}],
+                            'else': []}
+                for algorithm in algorithms
+            },
+            algorithm_status={a: status for a in algorithms}
+        )
+        camera.save()
+        return camera
+    return make
+
+
+def algorithm_status(camera, algorithm=ALGORITHM):
+    return models.Camera.objects.get(id=camera.id).algorithm_status.get(
+        algorithm
+    )
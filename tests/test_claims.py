@@ -0,0 +1,54 @@
+import collections
+import threading
+
+from benchmarks.stub_app import app
+from models import models
+from tests.conftest import ALGORITHM, algorithm_status
+
+THREADS = 16
+
+
+def _in_parallel(func):
+    barrier = threading.Barrier(THREADS)
+    results = []
+    lock = threading.Lock()
+
+    def run():
+        barrier.wait()
+        result = func()
+        with lock:
+            results.append(result)
+
+    threads = [threading.Thread(target=run) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_parallel_status_updates_have_one_winner(make_camera):
+    camera = make_camera()
+    results = _in_parallel(lambda: camera.set_algorithm_status(
+        ALGORITHM, 'running', expected=['idle']
+    ))
+    assert results.count(True) == 1
+    assert algorithm_status(camera) == 'running'
+
+
+def test_parallel_triggers_start_each_algorithm_once(make_camera):
+    algorithms = ['algo-%d' % i for i in range(4)]
+    camera = make_camera(algorithms=algorithms)
+
+    def trigger():
+        resp = app.test_client().post('/api/cameras/%s/trigger' % camera.id)
+        return resp.status_code, resp.get_json()
+
+    results = _in_parallel(trigger)
+    assert [status for status, _ in results] == [200] * THREADS
+    claims = collections.Counter(
+        algorithm for _, body in results for algorithm in body['algorithms']
+    )
+    assert claims == collections.Counter(algorithms)
+    statuses = models.Camera.objects.get(id=camera.id).algorithm_status
+    assert statuses == {algorithm: 'running' for algorithm in algorithms}
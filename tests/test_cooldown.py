@@ -0,0 +1,57 @@
+import time
+
+import scheduler
+from models import models
+from tests.conftest import ALGORITHM, algorithm_status
+
+
+def _post_result(client, camera):
+    started = time.perf_counter()
+    resp = client.post(
+        '/api/cameras/%s/result' % camera.id, json={ALGORITHM: 'person'}
+    )
+    assert resp.status_code == 200, resp.get_data()
+    return time.perf_counter() - started
+
+
+def test_result_latency_does_not_grow_with_cooldown(client, make_camera,
+                                                    monkeypatch):
+    latencies = {}
+    for cooldown in (0, 5, 30):
+        monkeypatch.setattr(scheduler, 'ALGORITHM_COOLDOWN', cooldown)
+        camera = make_camera('cam-%d' % cooldown, status='running')
+        latencies[cooldown] = _post_result(client, camera)
+    assert latencies[30] < 1.0
+    assert latencies[30] < latencies[0] + 0.5
+
+
+def test_algorithm_stays_in_cooldown_until_reactivated(client, make_camera,
+                                                       monkeypatch):
+    monkeypatch.setattr(scheduler, 'ALGORITHM_COOLDOWN', 0.5)
+    camera = make_camera(status='running')
+    _post_result(client, camera)
+    assert algorithm_status(camera) == 'cooldown'
+
+    # A trigger during the cooldown must not start a second instance.
+    resp = client.post('/api/cameras/%s/trigger' % camera.id)
+    assert resp.get_json()['algorithms'] == []
+
+    deadline = time.time() + 5
+    while algorithm_status(camera) != 'idle' and time.time() < deadline:
+        time.sleep(0.05)
+    assert algorithm_status(camera) == 'idle'
+    resp = client.post('/api/cameras/%s/trigger' % camera.id)
+    assert resp.get_json()['algorithms'] == [ALGORITHM]
+
+
+def test_unknown_algorithms_are_ignored(client, make_camera):
+    camera = make_camera(status='running')
+    resp = client.post(
+        '/api/cameras/%s/result' % camera.id,
+        json={ALGORITHM: 'person', 'not_an_algorithm': 'person'}
+    )
+    assert resp.status_code == 200, resp.get_data()
+    assert resp.get_json()['unknown'] == ['not_an_algorithm']
+    assert list(resp.get_json()['actions']) == [ALGORITHM]
+    statuses = models.Camera.objects.get(id=camera.id).algorithm_status
+    assert 'not_an_algorithm' not in statuses
@@ -0,0 +1,16 @@
+from debounce import MongoDebounceStore, ResultDebouncer
+
+
+def test_suppressed_counts_are_shared_through_mongo(make_camera):
+    camera = make_camera()
+    # Two processes sharing the mongo backend.
+    first = ResultDebouncer(MongoDebounceStore(), window=60)
+    second = ResultDebouncer(MongoDebounceStore(), window=60)
+
+    assert first.allow(camera.id, 'algo', 'person')
+    assert not second.allow(camera.id, 'algo', 'person')
+    assert not first.allow(camera.id, 'algo', 'person')
+    assert first.suppressed(camera.id) == second.suppressed(camera.id) == 2
+
+    first.forget(camera.id)
+    assert second.suppressed(camera.id) == 0
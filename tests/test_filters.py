@@ -0,0 +1,29 @@
+import pytest
+
+from tests.conftest import ALGORITHM
+
+
+def _names(resp):
+    assert resp.status_code == 200, resp.get_data()
+    return sorted(c['name'] for c in resp.get_json())
+
+
+def test_algorithm_status_filter(client, make_camera):
+    make_camera('idle')
+    make_camera('running', status='running')
+    resp = client.get('/api/cameras?algorithm_status=%s:running' % ALGORITHM)
+    assert _names(resp) == ['running']
+
+
+def test_algorithm_names_are_not_operators(client, make_camera):
+    make_camera('idle')
+    resp = client.get(
+        '/api/cameras?algorithm_status=%s__ne:running' % ALGORITHM
+    )
+    assert _names(resp) == []
+
+
+@pytest.mark.parametrize('algorithm', ['a.b', '$where'])
+def test_invalid_algorithm_names_are_rejected(client, algorithm):
+    resp = client.get('/api/cameras?algorithm_status=%s:idle' % algorithm)
+    assert resp.status_code == 400
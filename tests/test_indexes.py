@@ -0,0 +1,48 @@
+"""Camera list and status filter queries must be served by an index."""
+import pytest
+
+import api
+from models import models
+
+from tests.conftest import ALGORITHM, MONGO_HOST
+
+pytestmark = pytest.mark.skipif(
+    MONGO_HOST.startswith('mongomock://'),
+    reason='explain() needs a real mongod (set BENCH_MONGO_HOST)'
+)
+
+
+@pytest.fixture
+def cameras(make_camera):
+    for i in range(50):
+        make_camera(name='cam-%d' % i,
+                    status='running' if i % 5 else 'idle')
+    return models.Camera.objects.order_by(*api.CAMERA_LIST_ORDER)
+
+
+def assert_indexed(queryset):
+    plan = queryset.explain()
+    assert 'COLLSCAN' not in str(plan), plan
+
+
+def test_list_uses_index(cameras):
+    assert_indexed(cameras)
+    assert_indexed(cameras.limit(11))
+
+
+def test_list_after_cursor_uses_index(cameras):
+    cursor = api._cursor_values(cameras[9], api.CAMERA_LIST_ORDER)
+    assert_indexed(
+        api._apply_cursor(cameras, cursor, api.CAMERA_LIST_ORDER).limit(11)
+    )
+
+
+def test_algorithm_status_filter_uses_index(cameras):
+    assert_indexed(models.Camera.objects(
+        **{'algorithm_status__%s' % ALGORITHM: 'idle'}
+    ))
+
+
+def test_list_validator_uses_indexes(cameras):
+    for field in ('last_updated', 'status_updated'):
+        assert_indexed(models.Camera.objects.order_by('-' + field).limit(1))
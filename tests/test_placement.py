@@ -0,0 +1,146 @@
+import time
+
+import pytest
+
+import api
+import scheduler
+from benchmarks.run import _free_port, start_fake_rpyc
+from models import models
+from placement import Worker, WorkerRegistry
+
+ALGORITHMS = ['algo_%d' % i for i in range(8)]
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.05)
+    assert predicate()
+
+
+def _use_workers(monkeypatch, ports):
+    registry = WorkerRegistry([Worker('localhost', port) for port in ports])
+    monkeypatch.setattr(api, 'worker_registry', registry)
+    return registry
+
+
+def _hosts(camera):
+    return models.Camera.objects.get(id=camera.id).algorithm_hosts
+
+
+def _called(calls, call):
+    return sorted(name for c, name in calls if c == call)
+
+
+@pytest.fixture(scope='module')
+def servers():
+    """Two fake algorithm hosts, keyed like placement workers."""
+    servers = {}
+    for _ in range(2):
+        calls = []
+        servers['localhost:%d' % start_fake_rpyc(0.0, calls)] = calls
+    return servers
+
+
+@pytest.fixture
+def workers(servers, monkeypatch):
+    for calls in servers.values():
+        del calls[:]
+    return _use_workers(
+        monkeypatch, [int(key.split(':')[1]) for key in servers]
+    )
+
+
+def test_algorithms_stop_on_the_host_they_run_on(client, make_camera,
+                                                 servers, workers,
+                                                 monkeypatch):
+    monkeypatch.setattr(scheduler, 'ALGORITHM_COOLDOWN', 0)
+    camera = make_camera(algorithms=ALGORITHMS)
+    resp = client.post('/api/cameras/%s/trigger' % camera.id)
+    assert sorted(resp.get_json()['algorithms']) == ALGORITHMS
+
+    hosts = _hosts(camera)
+    assert set(hosts.values()) == set(servers)
+    for key, calls in servers.items():
+        placed = sorted(a for a, host in hosts.items() if host == key)
+        _wait_for(lambda: _called(calls, 'run_algorithm') == placed)
+
+    client.post('/api/cameras/%s/result' % camera.id,
+                json={a: 'person' for a in ALGORITHMS})
+    for key, calls in servers.items():
+        placed = sorted(a for a, host in hosts.items() if host == key)
+        _wait_for(
+            lambda: _called(calls, 'stop_and_delete_instance') == placed
+        )
+    _wait_for(lambda: not _hosts(camera))
+
+
+def test_failed_host_only_releases_its_own_algorithms(client, make_camera,
+                                                      servers, monkeypatch):
+    live = next(iter(servers))
+    dead_port = _free_port()
+    _use_workers(monkeypatch, [int(live.split(':')[1]), dead_port])
+    camera = make_camera(algorithms=ALGORITHMS)
+
+    resp = client.post('/api/cameras/%s/trigger' % camera.id)
+    assert resp.status_code == 200
+    assert 'localhost:%d' % dead_port in resp.get_json()['error']
+
+    status = models.Camera.objects.get(id=camera.id).algorithm_status
+    hosts = _hosts(camera)
+    assert hosts and set(hosts.values()) == {live}
+    assert sorted(resp.get_json()['algorithms']) == sorted(hosts)
+    for algorithm in ALGORITHMS:
+        expected = 'running' if algorithm in hosts else 'idle'
+        assert status[algorithm] == expected
+
+
+def test_placement_is_sticky():
+    registry = WorkerRegistry([Worker('host', port) for port in (1, 2, 3)])
+    placed = {
+        i: registry.place('cam-%d' % i, 'algo')[0] for i in range(300)
+    }
+    for i, key in placed.items():
+        assert registry.place('cam-%d' % i, 'algo', current=key) == \
+            (key, False)
+    again = WorkerRegistry([Worker('host', port) for port in (1, 2, 3)])
+    assert placed == {
+        i: again.place('cam-%d' % i, 'algo')[0] for i in range(300)
+    }
+
+
+def test_removing_a_host_moves_few_cameras():
+    def place_all(ports):
+        registry = WorkerRegistry([Worker('host', port) for port in ports])
+        return {
+            i: registry.place('cam-%d' % i, 'algo')[0] for i in range(1000)
+        }
+
+    before = place_all((1, 2, 3))
+    after = place_all((1, 2))
+    moved = [i for i in before if before[i] != after[i]]
+    assert len(moved) < 0.4 * len(before)
+    assert all(before[i] == 'host:3' for i in moved)
+
+
+def test_bulk_trigger_reports_failures_per_camera(client, make_camera,
+                                                  servers, monkeypatch):
+    live = next(iter(servers))
+    dead = 'localhost:%d' % _free_port()
+    _use_workers(monkeypatch, [int(live.split(':')[1]),
+                               int(dead.split(':')[1])])
+    cameras = [make_camera('cam-%d' % i, algorithms=ALGORITHMS)
+               for i in range(4)]
+
+    resp = client.post('/api/cameras/trigger',
+                       json={'cameras': [str(c.id) for c in cameras]})
+    assert resp.status_code == 200
+    body = resp.get_json()
+    for camera in cameras:
+        hosts = _hosts(camera)
+        assert set(hosts.values()) <= {live}
+        assert sorted(body['cameras'][str(camera.id)]) == sorted(hosts)
+        if len(hosts) < len(ALGORITHMS):
+            assert dead in body['errors'][str(camera.id)]
+        else:
+            assert str(camera.id) not in body['errors']
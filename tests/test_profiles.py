@@ -0,0 +1,53 @@
+import datetime
+
+from models import models
+
+
+def test_changing_profile_interval_reschedules_its_cameras(client,
+                                                           make_camera):
+    resp = client.post('/api/profiles', json={'name': 'every-30s'})
+    assert resp.status_code == 200, resp.get_data()
+    profile_id = resp.get_json()['id']
+    followers = [make_camera('cam-%d' % i) for i in range(5)]
+    own = make_camera('own-interval')
+    for camera in followers:
+        models.Camera.objects(id=camera.id).update_one(set__profile=profile_id)
+    models.Camera.objects(id=own.id).update_one(
+        set__profile=profile_id, set__trigger_interval=60
+    )
+
+    before = datetime.datetime.now()
+    resp = client.put('/api/profiles/%s' % profile_id,
+                      json={'trigger_interval': 30})
+    assert resp.status_code == 200, resp.get_data()
+    for camera in followers:
+        due = models.Camera.objects.get(id=camera.id).next_trigger_at
+        # The scheduler may already have run it once and moved it on.
+        assert before <= due <= before + datetime.timedelta(seconds=60)
+    assert models.Camera.objects.get(id=own.id).next_trigger_at is None
+
+    resp = client.put('/api/profiles/%s' % profile_id,
+                      json={'trigger_interval': None})
+    assert resp.status_code == 200, resp.get_data()
+    for camera in followers:
+        assert models.Camera.objects.get(id=camera.id).next_trigger_at is None
+
+
+def test_actions_are_optional_with_a_profile(client):
+    profile_id = client.post(
+        '/api/profiles', json={'name': 'shared'}
+    ).get_json()['id']
+
+    resp = client.post('/api/cameras',
+                       json={'name': 'single', 'profile': profile_id})
+    assert resp.status_code == 200, resp.get_data()
+    resp = client.post('/api/cameras/bulk', json={'cameras': [
+        {'name': 'bulk-%d' % i, 'profile': profile_id} for i in range(3)
+    ]})
+    assert resp.status_code == 200, resp.get_data()
+
+    assert client.post('/api/cameras',
+                       json={'name': 'no-rules'}).status_code == 400
+    assert client.post('/api/cameras/bulk', json={'cameras': [
+        {'name': 'no-rules'}
+    ]}).status_code == 400
@@ -0,0 +1,35 @@
+import api
+from response_cache import response_cache
+
+
+def test_list_is_revalidated_without_building_the_body(client, make_camera,
+                                                       monkeypatch):
+    make_camera()
+    resp = client.get('/api/cameras')
+    assert resp.status_code == 200
+    assert resp.is_streamed
+    etag = resp.headers['ETag']
+    assert resp.headers['Last-Modified']
+    resp.close()
+
+    # Past the cache TTL, the 304 must come from the validator alone.
+    response_cache.invalidate('cameras')
+    monkeypatch.setattr(api, '_list_documents', None)
+    resp = client.get('/api/cameras', headers={'If-None-Match': etag})
+    assert resp.status_code == 304
+
+
+def test_list_etag_changes_with_the_cameras(client, make_camera):
+    camera = make_camera()
+    etag = client.get('/api/cameras').headers['ETag']
+
+    camera.set_algorithm_status('test_algo', 'running')
+    resp = client.get('/api/cameras', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert resp.headers['ETag'] != etag
+
+    etag = resp.headers['ETag']
+    make_camera('other')
+    resp = client.get('/api/cameras', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert len(resp.get_json()) == 2
@@ -0,0 +1,26 @@
+import urllib.parse
+
+import pytest
+
+
+def _get_results(client, camera, **args):
+    return client.get('/api/cameras/%s/results?%s' % (
+        camera.id, urllib.parse.urlencode(args)
+    ))
+
+
+@pytest.mark.parametrize('args', [
+    {'start': '2026-10-18T00:00:00Z'},
+    {'start': '2026-10-18T00:00:00+00:00', 'end': '2026-10-19T00:00:00+00:00'},
+    {'start': '2026-10-18T02:00:00+02:00', 'end': '2026-10-19T12:00:00'},
+    {'start': '1760745600'},
+])
+def test_time_range_accepts_iso_8601_and_epoch(client, make_camera, args):
+    resp = _get_results(client, make_camera(), **args)
+    assert resp.status_code == 200, resp.get_data()
+
+
+@pytest.mark.parametrize('start', ['1e20', 'inf', '-inf', 'nan', 'yesterday'])
+def test_invalid_times_are_rejected(client, make_camera, start):
+    resp = _get_results(client, make_camera(), start=start)
+    assert resp.status_code == 400, resp.get_data()
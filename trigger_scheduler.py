@@ -0,0 +1,175 @@
+import logging
+import math
+import random
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+from config import *
+import metrics
+from models import models
+
+
+def first_trigger_at(interval, now=None):
+    """First run of a newly scheduled camera, jittered over one interval.
+
+    Spreading the phase keeps cameras that got the same interval at the
+    same moment (a bulk registration, a profile edit) from starting
+    together; later runs keep that phase.
+    """
+    return (now or datetime.now()) + timedelta(
+        seconds=random.uniform(0, interval)
+    )
+
+
+def next_trigger_at(due, interval, now):
+    """The first run after `now` in the series `due` + k * interval."""
+    periods = max(1, math.ceil((now - due).total_seconds() / interval))
+    return due + timedelta(seconds=periods * interval)
+
+
+def reschedule_profile(profile_id, interval):
+    """Re-phase the cameras following a profile's trigger interval.
+
+    Camera ids are read in batches of TRIGGER_RESCHEDULE_BATCH and each
+    batch is written with one bulk_write, every camera getting its own
+    jitter, so changing the interval of a profile used by thousands of
+    cameras neither loads their documents nor makes them fire at once.
+    """
+    query = {'profile': profile_id, 'trigger_interval': None}
+    collection = models.Camera._get_collection()
+    if not interval:
+        collection.update_many(query, {'$unset': {'next_trigger_at': ''}})
+        return
+    now = datetime.now()
+    batch = []
+    for doc in collection.find(query, {'_id': 1}).batch_size(
+            TRIGGER_RESCHEDULE_BATCH):
+        batch.append(UpdateOne({'_id': doc['_id']}, {'$set': {
+            'next_trigger_at': first_trigger_at(interval, now)
+        }}))
+        if len(batch) >= TRIGGER_RESCHEDULE_BATCH:
+            collection.bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.bulk_write(batch, ordered=False)
+
+
+class TriggerScheduler(object):
+    """Trigger cameras periodically, staggered over their interval.
+
+    Each scheduled camera stores its next run in next_trigger_at. Every
+    poll, due cameras are read oldest first through the next_trigger_at
+    index and claimed by moving next_trigger_at forward with a conditional
+    update, so several processes can run the scheduler without triggering
+    a camera twice. At most `max_inflight` claimed cameras are being
+    triggered at a time, and nothing is claimed while an admission probe
+    reports a downstream backlog; due cameras then wait and show up as lag.
+
+    `trigger(camera)` starts the camera's algorithms and `interval_of(camera)`
+    returns its effective interval in seconds, or None once unscheduled.
+    """
+    def __init__(self, trigger, interval_of, overloaded=None,
+                 poll_interval=TRIGGER_POLL_INTERVAL,
+                 max_inflight=TRIGGER_MAX_INFLIGHT):
+        self.trigger = trigger
+        self.interval_of = interval_of
+        self.overloaded = overloaded
+        self.poll_interval = poll_interval
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.due = 0
+        self.lag = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_inflight, thread_name_prefix='trigger'
+        )
+        self._thread = None
+
+    def _claim(self, camera, now):
+        interval = self.interval_of(camera)
+        if interval:
+            update = {'set__next_trigger_at': next_trigger_at(
+                camera.next_trigger_at, interval, now
+            )}
+        else:
+            update = {'unset__next_trigger_at': True}
+        claimed = models.Camera.objects(
+            id=camera.id, next_trigger_at=camera.next_trigger_at
+        ).update_one(**update) == 1
+        return claimed and bool(interval)
+
+    def poll(self):
+        """Dispatch the cameras that are due; return how many were."""
+        now = datetime.now()
+        due = models.Camera.objects(next_trigger_at__lte=now)
+        self.due = due.count()
+        oldest = due.order_by('next_trigger_at').only(
+            'next_trigger_at'
+        ).first()
+        self.lag = (now - oldest.next_trigger_at).total_seconds() \
+            if oldest else 0
+        with self._lock:
+            room = self.max_inflight - self.inflight
+        if not self.due or room <= 0:
+            return 0
+        if self.overloaded is not None and self.overloaded() is not None:
+            return 0
+        dispatched = 0
+        cameras = due.order_by('next_trigger_at').only(
+            'action_dict', 'streaming_url', 'algorithm_hosts', 'profile',
+            'trigger_interval', 'next_trigger_at'
+        ).limit(room)
+        for camera in cameras:
+            if not self._claim(camera, now):
+                continue
+            trigger_lag.observe((now - camera.next_trigger_at).total_seconds())
+            with self._lock:
+                self.inflight += 1
+            self._executor.submit(self._run, camera)
+            dispatched += 1
+        return dispatched
+
+    def _run(self, camera):
+        try:
+            self.trigger(camera)
+            scheduled_triggers.inc(status='ok')
+        except Exception:
+            scheduled_triggers.inc(status='error')
+            logging.exception('Scheduled trigger of camera %s failed',
+                              camera.id)
+        finally:
+            with self._lock:
+                self.inflight -= 1
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._loop, name='trigger-scheduler'
+            )
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                self.poll()
+            except Exception:
+                logging.exception('Trigger scheduler poll failed')
+            time.sleep(self.poll_interval)
+
+
+scheduled_triggers = metrics.registry.counter(
+    'camera_cloud_scheduled_triggers_total',
+    'Cameras triggered by the trigger scheduler.',
+    labels=('status',)
+)
+trigger_lag = metrics.registry.histogram(
+    'camera_cloud_scheduled_trigger_lag_seconds',
+    'Delay between a scheduled trigger falling due and its dispatch.',
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
@@ -1,21 +1,33 @@
+import base64
 import simplejson as json
 import crypt
 
-from flask import request, make_response
+from flask import request, make_response, Response, stream_with_context
+
+from config import STREAM_BATCH_SIZE, MAX_ERROR_PAYLOAD
 
 import exception_handler
+import serializer
+
+def _truncate_payload(payload):
+    if len(payload) <= MAX_ERROR_PAYLOAD:
+        return payload
+    return '%s... (%d bytes)' % (payload[:MAX_ERROR_PAYLOAD], len(payload))
+
 
 def get_request_data():
     if request.data:
         try:
-            data = json.loads(request.data)
+            data = serializer.loads(request.data)
         except Exception:
             raise exception_handler.BadRequest(
-                'request data is not json formatted: %s' % request.data
+                'request data is not json formatted: %s' %
+                    _truncate_payload(request.data)
             )
         if not isinstance(data, dict):
             raise exception_handler.BadRequest(
-                'request data is not json formatted dict: %s' % request.data
+                'request data is not json formatted dict: %s' %
+                    _truncate_payload(request.data)
             )
         return data
     else:
@@ -26,11 +38,54 @@ def make_json_response(status_code, data):
     """Wrap json format to the reponse object."""
     #with open('/tmp/debug', 'w+') as f:
      #   f.write(str(data))
-    result = json.dumps(data)
+    result = serializer.dumps(data)
     resp = make_response(result, status_code)
     resp.headers['Content-type'] = 'application/json'
 
     return resp
 
+def make_json_stream_response(status_code, items):
+    """Stream an iterable of items to the client as a JSON array.
+
+    Items are serialized and flushed STREAM_BATCH_SIZE at a time, so only one
+    batch is held in memory regardless of the length of the iterable.
+    """
+    def generate():
+        yield b'['
+        batch = []
+        separator = b''
+        for item in items:
+            batch.append(serializer.dumps(item))
+            if len(batch) >= STREAM_BATCH_SIZE:
+                yield separator + b','.join(batch)
+                separator = b','
+                batch = []
+        if batch:
+            yield separator + b','.join(batch)
+        yield b']'
+
+    return Response(
+        stream_with_context(generate()),
+        status=status_code,
+        content_type='application/json'
+    )
+
+
+def encode_cursor(values):
+    """Encode a list of keyset values into an opaque pagination cursor."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Decode a cursor made by encode_cursor, raising ValueError if invalid."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError('invalid cursor: %s' % cursor)
+    if not isinstance(values, list):
+        raise ValueError('invalid cursor: %s' % cursor)
+    return values
+
+
 def shifttimedelta(td):
     return td.days, td.seconds//3600, (td.seconds//60)%60